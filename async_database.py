@@ -0,0 +1,32 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+
+class AsyncScheduleDatabase:
+    """Асинхронный фасад над базой расписания.
+
+    Каждый публичный метод базы превращается в корутину, которая выполняет
+    вызов в ограниченном пуле потоков, не блокируя цикл событий бота.
+    """
+
+    def __init__(self, db: Any, max_workers: int = 4):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.db, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(attr, *args, **kwargs))
+
+        return call
+
+    def close(self) -> None:
+        """Дождаться запущенных запросов и закрыть пул потоков"""
+        self._executor.shutdown(wait=True)
@@ -1,16 +1,44 @@
+import asyncio
 import os
 import datetime
+import functools
+import io
 import logging
+import secrets
 from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
+from telegram.error import BadRequest
+from telegram.ext import (
+    Application, CallbackQueryHandler, CommandHandler, ContextTypes, MessageHandler, filters
+)
 from dotenv import load_dotenv
-from database import ScheduleDatabase
-from keyboards import create_main_menu
+from async_database import AsyncScheduleDatabase
+from broadcast import Broadcaster, BROADCAST_RATE
+from cache import ScheduleCache
+from database import ScheduleDatabase, DEFAULT_SUBGROUP, VALID_SUBGROUPS
+from models import TIME_RANGE_DASH
+from sqlite_database import SQLiteScheduleDatabase
+from import_export import (
+    ImportFormatError, detect_format, import_lessons, export_to_file, EXPORT_FORMATS
+)
+from keyboards import (
+    create_main_menu, BUTTON_TODAY, BUTTON_TOMORROW, BUTTON_WEEK, BUTTON_ADD,
+    BUTTON_DELETE, BUTTON_STATS, BUTTON_HELP, BUTTON_HOME, BUTTON_FOR_ALL, SUBGROUP_BUTTONS,
+    CALLBACK_DAY, CALLBACK_WEEK, CALLBACK_SUBGROUP, CALLBACK_DELETE, CALLBACK_DELETE_CANCEL,
+    create_days_inline_keyboard, create_subgroups_inline_keyboard, create_delete_confirmation_keyboard
+)
+from reminders import ReminderScheduler, REMINDER_LEAD_MINUTES, parse_utc_offset
+from search_index import normalize_subject
+from update_processor import ChatOrderedUpdateProcessor, MAX_CONCURRENT_UPDATES
 from messages import (
     get_help_message, get_days_list_message, get_subgroups_list_message,
-    get_add_instruction_message, format_delete_confirmation_message,
+    get_add_instruction_message, format_delete_confirmation_message, format_lesson_deleted_message,
     format_day_command_response, format_full_schedule_by_days,
-    format_week_overview, format_all_lessons_message, DAYS_FULL
+    format_week_overview, format_all_lessons_page, format_today_response,
+    format_broadcast_status, split_message, page_count, ALL_LESSONS_PAGE_SIZE,
+    get_import_instruction_message, format_import_result, format_search_results,
+    format_stats_message, get_update_instruction_message, format_conflict_warning,
+    format_conflicts_report,
+    cached_render, render_cache, day_command, DAYS_FULL, DAY_SLUGS, MAX_MESSAGE_LENGTH
 )
 
 # === НАСТРОЙКА ЛОГГИРОВАНИЯ ===
@@ -30,68 +58,152 @@ if not TOKEN:
     print("❌ ОШИБКА: Токен не найден!")
     exit(1)
 
+# Режим получения обновлений: BOT_MODE=polling (по умолчанию) или webhook.
+# Для webhook нужен внешний HTTPS-адрес WEBHOOK_URL (например, за обратным прокси);
+# бот слушает WEBHOOK_LISTEN:WEBHOOK_PORT и принимает только запросы с секретом
+# WEBHOOK_SECRET из заголовка X-Telegram-Bot-Api-Secret-Token
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram').strip('/')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+
+# MAX_CONCURRENT_UPDATES - сколько обновлений обрабатывать одновременно
+# (обновления одного чата всё равно идут по порядку)
+MAX_CONCURRENT = int(os.getenv('MAX_CONCURRENT_UPDATES', str(MAX_CONCURRENT_UPDATES)))
+
 # Инициализация базы данных
-db = ScheduleDatabase()
+# DB_BACKEND=json (по умолчанию) или sqlite; DB_FILE - путь к файлу базы
+# DB_JOURNAL=1 - дописывать изменения в журнал вместо перезаписи всего файла
+# JSON_DB_FILE - JSON-база, из которой SQLite один раз переносит уроки
+DB_BACKEND = os.getenv('DB_BACKEND', 'json').lower()
+DB_WORKERS = int(os.getenv('DB_WORKERS', '4'))
+JSON_DB_FILE = os.getenv('JSON_DB_FILE', 'schedule.json')
+if DB_BACKEND == 'sqlite':
+    db = SQLiteScheduleDatabase(os.getenv('DB_FILE', 'schedule.db'), pool_size=DB_WORKERS)
+    migrated = db.migrate_from_json(JSON_DB_FILE)
+    if migrated:
+        print(f"✅ Перенесено уроков из {JSON_DB_FILE} в SQLite: {migrated}")
+else:
+    db = ScheduleDatabase(
+        os.getenv('DB_FILE', JSON_DB_FILE),
+        journal=os.getenv('DB_JOURNAL', '').lower() in ('1', 'true', 'yes')
+    )
+# Обработчики обращаются к базе только через асинхронный фасад,
+# чтобы дисковый ввод-вывод не блокировал цикл событий
+async_db = AsyncScheduleDatabase(db, max_workers=DB_WORKERS)
 print("🤖 Бот с поддержкой подгрупп запущен")
 
 # === КОНСТАНТЫ ===
 DAYS_RU = DAYS_FULL
 DAYS_ORDER = {day.lower(): idx for idx, day in enumerate(DAYS_RU)}
-VALID_SUBGROUPS = ['1', '2', 'all']
+# IMPORT_MAX_MB - наибольший размер файла для /import
+IMPORT_MAX_MB = int(os.getenv('IMPORT_MAX_MB', '5'))
 
 # === КЭШИРОВАНИЕ ДАННЫХ ===
-_schedule_cache = {}
-_cache_timestamp = None
-
-# === ХРАНЕНИЕ ВЫБРАННОЙ ПОДГРУППЫ ===
-user_subgroups = {}
+# База сама сообщает, какие дни и подгруппы изменились, поэтому срок жизни не нужен
+schedule_cache = ScheduleCache(ttl=None)
+db.subscribe(schedule_cache.on_change)
+
+# === НАПОМИНАНИЯ ===
+# SCHEDULE_TZ - часовой пояс расписания, REMINDER_LEAD - за сколько минут напоминать
+reminder_scheduler = ReminderScheduler(
+    async_db,
+    lead_minutes=int(os.getenv('REMINDER_LEAD', str(REMINDER_LEAD_MINUTES))),
+    tz=parse_utc_offset(os.getenv('SCHEDULE_TZ', 'UTC+3'))
+)
+db.subscribe(reminder_scheduler.on_change)
 
+# === РАССЫЛКИ ===
+# Все массовые отправки (напоминания, объявления) идут через один ограничитель
+# скорости. ADMIN_IDS - id пользователей через запятую, которым доступен /announce
+broadcaster = Broadcaster(rate=float(os.getenv('BROADCAST_RATE', str(BROADCAST_RATE))))
+ADMIN_IDS = {int(user_id) for user_id in os.getenv('ADMIN_IDS', '').replace(',', ' ').split()}
 
 # === УТИЛИТНЫЕ ФУНКЦИИ ===
-def get_cached_schedule(subgroup: str = 'all'):
-    """Кэшируем расписание для каждой подгруппы отдельно"""
-    global _schedule_cache, _cache_timestamp
-
-    cache_key = f"subgroup_{subgroup}"
-    now = datetime.datetime.now()
-
-    if (cache_key not in _schedule_cache or
-            _cache_timestamp is None or
-            (now - _cache_timestamp).seconds > 300):
+def fill_schedule_cache(weeks: dict) -> dict:
+    """Положить в кэш недельное расписание подгрупп, включая пустые дни"""
+    cached = {}
+    for subgroup, week in weeks.items():
+        cached[subgroup] = {}
+        for day in DAYS_RU:
+            lessons = week.get(day, [])
+            schedule_cache.set(subgroup, day, lessons)
+            cached[subgroup][day] = lessons
+    return cached
+
+
+async def get_cached_schedule(subgroup: str = 'all'):
+    """Расписание подгруппы на все дни недели (пустые дни - пустые списки)"""
+    week = {}
+    for day in DAYS_RU:
+        lessons = schedule_cache.get(subgroup, day)
+        if lessons is None:
+            # Любой промах - перестраиваем всю неделю подгруппы за один запрос
+            version = schedule_cache.version
+            fresh = await async_db.get_week_for_subgroup(subgroup)
+            if schedule_cache.version != version:
+                # Пока читали, расписание успело измениться - не кэшируем
+                return {day: fresh.get(day, []) for day in DAYS_RU}
+            logging.info(f"Кэш для подгруппы {subgroup} обновлен")
+            return fill_schedule_cache({subgroup: fresh})[subgroup]
+        week[day] = lessons
+    return week
+
+
+def clear_schedule_cache():
+    """Полная очистка кэша (изменения уроков сбрасывают его сами через подписку)"""
+    schedule_cache.clear()
+    render_cache.clear()
+
+
+# Настройки пользователей читаются и пишутся прямо из цикла событий, минуя
+# async_db, намеренно: это словари в памяти базы (UserSettingsBuffer), а на
+# диск изменения уходят пачкой из таймера flush_users в отдельном потоке
+def get_user_subgroup(user_id: int) -> str:
+    """Получить выбранную подгруппу пользователя"""
+    return db.get_user_subgroup(user_id) or DEFAULT_SUBGROUP
 
-        _schedule_cache[cache_key] = {}
-        days = db.get_all_days_with_lessons_for_subgroup(subgroup)
-        for day in days:
-            lessons = db.get_lessons_by_day_and_subgroup(day, subgroup)
-            if lessons:
-                _schedule_cache[cache_key][day] = lessons
-        _cache_timestamp = now
-        logging.info(f"Кэш для подгруппы {subgroup} обновлен")
 
-    return _schedule_cache.get(cache_key, {})
+def set_user_subgroup(user_id: int, subgroup: str, user=None):
+    """Установить подгруппу для пользователя (запись на диск - отложенная, пачкой)"""
+    profile = {}
+    if user is not None:
+        profile = {'username': user.username, 'first_name': user.first_name}
+    db.set_user_subgroup(user_id, subgroup, **profile)
+    if db.get_user_notifications(user_id):
+        reminder_scheduler.set_user(user_id, subgroup, True)
 
 
-def clear_schedule_cache(subgroup: str = None):
-    """Очистка кэша"""
-    global _schedule_cache, _cache_timestamp
-    if subgroup:
-        cache_key = f"subgroup_{subgroup}"
-        if cache_key in _schedule_cache:
-            del _schedule_cache[cache_key]
-    else:
-        _schedule_cache = {}
-    _cache_timestamp = None
+async def render_day_message(subgroup: str, day: str) -> str:
+    """Текст расписания дня для подгруппы (через кэши данных и текстов)"""
+    version = await async_db.get_version()
+    cached_data = await get_cached_schedule(subgroup)
+    lessons = cached_data[day]
+    return cached_render(
+        'day', day, subgroup, version, (lessons,),
+        format_day_command_response, day, lessons, subgroup
+    )
 
 
-def get_user_subgroup(user_id: int) -> str:
-    """Получить выбранную подгруппу пользователя"""
-    return user_subgroups.get(user_id, '1')
+async def render_week_message(subgroup: str) -> str:
+    """Текст расписания недели для подгруппы"""
+    version = await async_db.get_version()
+    cached_data = await get_cached_schedule(subgroup)
+    message = cached_render(
+        'week', None, subgroup, version, tuple(cached_data.values()),
+        format_full_schedule_by_days, cached_data
+    )
+    return message + f"\n\n🎯 Подгруппа: {subgroup}"
 
 
-def set_user_subgroup(user_id: int, subgroup: str):
-    """Установить подгруппу для пользователя"""
-    user_subgroups[user_id] = subgroup
-    clear_schedule_cache(subgroup)
+async def reply_long(update: Update, text: str, **kwargs):
+    """Ответить текстом любой длины: части до 4096 символов уходят по порядку"""
+    parts = split_message(text)
+    for i, part in enumerate(parts):
+        # Клавиатура и прочие параметры - только у последней части
+        await update.message.reply_text(part, **(kwargs if i == len(parts) - 1 else {}))
 
 
 # === КОМАНДЫ БОТА ===
@@ -102,9 +214,13 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = user.id
         subgroup = get_user_subgroup(user_id)
 
-        cached_data = get_cached_schedule(subgroup)
-        days_with_lessons = list(cached_data.keys())
-        week_overview = format_week_overview(days_with_lessons)
+        version = await async_db.get_version()
+        cached_data = await get_cached_schedule(subgroup)
+        days_with_lessons = [day for day, lessons in cached_data.items() if lessons]
+        week_overview = cached_render(
+            'overview', None, subgroup, version, tuple(cached_data.values()),
+            format_week_overview, days_with_lessons
+        )
 
         keyboard = create_main_menu(subgroup)
 
@@ -135,17 +251,16 @@ async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         today_idx = datetime.datetime.now().weekday()
         today_ru = DAYS_RU[today_idx]
 
-        cached_data = get_cached_schedule(subgroup)
-        lessons = cached_data.get(today_ru, [])
+        version = await async_db.get_version()
+        cached_data = await get_cached_schedule(subgroup)
+        lessons = cached_data[today_ru]
 
-        if lessons:
-            message = f"📅 {today_ru} (подгруппа {subgroup}):\n\n"
-            for lesson in lessons:
-                message += f"• {lesson['time']} - {lesson['subject']}\n"
-        else:
-            message = f"🎉 {today_ru}\nСегодня нет уроков для подгруппы {subgroup}!"
+        message = cached_render(
+            'today', today_ru, subgroup, version, (lessons,),
+            format_today_response, today_ru, lessons, subgroup
+        )
 
-        await update.message.reply_text(message)
+        await reply_long(update, message)
     except Exception as e:
         print(f"❌ ОШИБКА в today_command: {e}")
         import traceback
@@ -162,17 +277,16 @@ async def tomorrow_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         tomorrow_idx = (datetime.datetime.now().weekday() + 1) % 7
         tomorrow_ru = DAYS_RU[tomorrow_idx]
 
-        cached_data = get_cached_schedule(subgroup)
-        lessons = cached_data.get(tomorrow_ru, [])
+        version = await async_db.get_version()
+        cached_data = await get_cached_schedule(subgroup)
+        lessons = cached_data[tomorrow_ru]
 
-        if lessons:
-            message = f"📅 {tomorrow_ru} (подгруппа {subgroup}):\n\n"
-            for lesson in lessons:
-                message += f"• {lesson['time']} - {lesson['subject']}\n"
-        else:
-            message = f"🎉 {tomorrow_ru}\nЗавтра нет уроков для подгруппы {subgroup}!"
+        message = cached_render(
+            'tomorrow', tomorrow_ru, subgroup, version, (lessons,),
+            format_today_response, tomorrow_ru, lessons, subgroup, True
+        )
 
-        await update.message.reply_text(message)
+        await reply_long(update, message)
     except Exception as e:
         print(f"❌ ОШИБКА в tomorrow_command: {e}")
         import traceback
@@ -186,11 +300,8 @@ async def week_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         subgroup = get_user_subgroup(user_id)
 
-        cached_data = get_cached_schedule(subgroup)
-        message = format_full_schedule_by_days(cached_data)
-        message += f"\n\n🎯 Подгруппа: {subgroup}"
-
-        await update.message.reply_text(message)
+        message = await render_week_message(subgroup)
+        await reply_long(update, message)
     except Exception as e:
         print(f"❌ ОШИБКА в week_command: {e}")
         import traceback
@@ -205,7 +316,7 @@ async def schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         subgroup = get_user_subgroup(user_id)
 
         message = get_days_list_message(subgroup)
-        await update.message.reply_text(message)
+        await update.message.reply_text(message, reply_markup=create_days_inline_keyboard())
     except Exception as e:
         print(f"❌ ОШИБКА в schedule_command: {e}")
         import traceback
@@ -216,8 +327,9 @@ async def schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def subgroup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать список подгрупп: /subgroup"""
     try:
+        subgroup = get_user_subgroup(update.effective_user.id)
         message = get_subgroups_list_message()
-        await update.message.reply_text(message)
+        await update.message.reply_text(message, reply_markup=create_subgroups_inline_keyboard(subgroup))
     except Exception as e:
         print(f"❌ ОШИБКА в subgroup_command: {e}")
         import traceback
@@ -226,52 +338,14 @@ async def subgroup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # === КОМАНДЫ ДЛЯ ДНЕЙ ===
-async def day_monday_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Расписание на понедельник: /day_monday"""
-    await handle_day_command(update, context, "Понедельник")
-
-
-async def day_tuesday_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Расписание на вторник: /day_tuesday"""
-    await handle_day_command(update, context, "Вторник")
-
-
-async def day_wednesday_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Расписание на среду: /day_wednesday"""
-    await handle_day_command(update, context, "Среда")
-
-
-async def day_thursday_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Расписание на четверг: /day_thursday"""
-    await handle_day_command(update, context, "Четверг")
-
-
-async def day_friday_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Расписание на пятницу: /day_friday"""
-    await handle_day_command(update, context, "Пятница")
-
-
-async def day_saturday_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Расписание на субботу: /day_saturday"""
-    await handle_day_command(update, context, "Суббота")
-
-
-async def day_sunday_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Расписание на воскресенье: /day_sunday"""
-    await handle_day_command(update, context, "Воскресенье")
-
-
 async def handle_day_command(update: Update, context: ContextTypes.DEFAULT_TYPE, day: str):
     """Обработчик команд для дней"""
     try:
         user_id = update.effective_user.id
         subgroup = get_user_subgroup(user_id)
 
-        cached_data = get_cached_schedule(subgroup)
-        lessons = cached_data.get(day, [])
-
-        message = format_day_command_response(day, lessons, subgroup)
-        await update.message.reply_text(message)
+        message = await render_day_message(subgroup, day)
+        await reply_long(update, message)
 
     except Exception as e:
         print(f"❌ Ошибка в команде дня {day}: {e}")
@@ -279,26 +353,11 @@ async def handle_day_command(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
 
 # === КОМАНДЫ ПОДГРУПП ===
-async def subgroup_1_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Выбор подгруппы 1: /subgroup_1"""
-    await handle_subgroup_command(update, context, '1')
-
-
-async def subgroup_2_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Выбор подгруппы 2: /subgroup_2"""
-    await handle_subgroup_command(update, context, '2')
-
-
-async def subgroup_all_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Выбор 'для всех' подгрупп: /subgroup_all"""
-    await handle_subgroup_command(update, context, 'all')
-
-
 async def handle_subgroup_command(update: Update, context: ContextTypes.DEFAULT_TYPE, subgroup: str):
     """Обработчик команд подгрупп"""
     try:
         user_id = update.effective_user.id
-        set_user_subgroup(user_id, subgroup)
+        set_user_subgroup(user_id, subgroup, update.effective_user)
         keyboard = create_main_menu(subgroup)
 
         await update.message.reply_text(
@@ -335,12 +394,21 @@ async def add_lesson_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
             'subgroup': subgroup
         }
 
-        result = db.add_lesson(lesson_data)
+        result = await async_db.add_lesson(lesson_data)
 
         if result.get('success'):
-            clear_schedule_cache(subgroup)
+            # База привела время и день к каноничному виду: 08.00 -> 8:00, пн -> Понедельник
+            time = lesson_data['time']
+            if lesson_data.get('end'):
+                time += f"{TIME_RANGE_DASH}{lesson_data['end']}"
             subgroup_text = f" (подгруппа {subgroup})" if subgroup != 'all' else " (для всех)"
-            await update.message.reply_text(f"✅ '{subject}' добавлен на {day} в {time}{subgroup_text}")
+            conflicts = await async_db.find_conflicts(result['lesson_id'])
+            await update.message.reply_text(
+                f"✅ '{subject}' добавлен на {lesson_data['day']} в {time}{subgroup_text}"
+                f"{format_conflict_warning(conflicts)}"
+            )
+        elif result.get('error'):
+            await update.message.reply_text(f"❌ {result['error']}\n\n{get_add_instruction_message()}")
         else:
             await update.message.reply_text("❌ Ошибка при добавлении урока")
     except Exception as e:
@@ -350,6 +418,45 @@ async def add_lesson_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
 
 
+async def update_lesson_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Заменить урок: /update <id> <предмет> <время> <день> [подгруппа]"""
+    try:
+        if not context.args or len(context.args) < 4:
+            await update.message.reply_text(get_update_instruction_message())
+            return
+
+        try:
+            lesson_id = int(context.args[0])
+        except ValueError:
+            await update.message.reply_text("❌ ID должен быть числом")
+            return
+
+        lesson_data = {'subject': context.args[1], 'time': context.args[2], 'day': context.args[3]}
+        if len(context.args) > 4:
+            # Без подгруппы урок остаётся в прежней
+            lesson_data['subgroup'] = context.args[4]
+
+        result = await async_db.update_lesson(lesson_id, lesson_data)
+        if result.get('not_found'):
+            await update.message.reply_text(f"❌ Урок с ID {lesson_id} не найден")
+            return
+        if not result['success']:
+            await update.message.reply_text(f"❌ {result['error']}\n\n{get_update_instruction_message()}")
+            return
+
+        lesson = await async_db.get_lesson_by_id(lesson_id)
+        conflicts = await async_db.find_conflicts(lesson_id)
+        await update.message.reply_text(
+            f"✅ Урок #{lesson_id} изменён: {lesson.subject} ({lesson.day}, {lesson.time_text})"
+            f"{format_conflict_warning(conflicts)}"
+        )
+    except Exception as e:
+        print(f"❌ ОШИБКА в update_lesson_command: {e}")
+        import traceback
+        traceback.print_exc()
+        await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
+
+
 async def delete_lesson_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Удалить урок: /delete <id>"""
     try:
@@ -359,14 +466,16 @@ async def delete_lesson_command(update: Update, context: ContextTypes.DEFAULT_TY
 
         try:
             lesson_id = int(context.args[0])
-            lesson = db.get_lesson_by_id(lesson_id)
+            lesson = await async_db.get_lesson_by_id(lesson_id)
 
             if not lesson:
                 await update.message.reply_text("❌ Урок не найден")
                 return
 
             message = format_delete_confirmation_message(lesson)
-            await update.message.reply_text(message)
+            await update.message.reply_text(
+                message, reply_markup=create_delete_confirmation_keyboard(lesson_id)
+            )
         except ValueError:
             await update.message.reply_text("❌ Введите правильный ID (число)")
     except Exception as e:
@@ -377,20 +486,15 @@ async def delete_lesson_command(update: Update, context: ContextTypes.DEFAULT_TY
 
 
 async def confirm_delete_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Подтверждение удаления: /confirm_delete_<id>"""
+    """Подтверждение удаления текстом (старые сообщения): /confirm_delete_<id>"""
     try:
         command = update.message.text
         if command.startswith('/confirm_delete_'):
             lesson_id = int(command.replace('/confirm_delete_', ''))
 
-            lesson = db.get_lesson_by_id(lesson_id)
+            lesson = await async_db.delete_lesson_returning(lesson_id)
             if lesson:
-                success = db.delete_lesson(lesson_id)
-                if success:
-                    clear_schedule_cache()
-                    await update.message.reply_text(f"✅ Урок #{lesson_id} удален")
-                else:
-                    await update.message.reply_text("❌ Ошибка при удалении")
+                await update.message.reply_text(format_lesson_deleted_message(lesson))
             else:
                 await update.message.reply_text("❌ Урок не найден")
 
@@ -399,27 +503,144 @@ async def confirm_delete_command(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
 
 
+async def reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Включить или выключить напоминания: /reminders"""
+    try:
+        user = update.effective_user
+        # Только память базы, см. get_user_subgroup
+        enabled = not db.get_user_notifications(user.id)
+        db.set_user_notifications(user.id, enabled, username=user.username, first_name=user.first_name)
+        reminder_scheduler.set_user(user.id, get_user_subgroup(user.id), enabled)
+
+        if enabled:
+            await update.message.reply_text(
+                f"🔔 Напоминания включены: за {reminder_scheduler.lead_minutes} мин до занятия"
+            )
+        else:
+            await update.message.reply_text("🔕 Напоминания выключены")
+    except Exception as e:
+        print(f"❌ ОШИБКА в reminders_command: {e}")
+        import traceback
+        traceback.print_exc()
+        await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
+
+
+async def announce_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Объявление всем пользователям: /announce <текст>"""
+    try:
+        if update.effective_user.id not in ADMIN_IDS:
+            await update.message.reply_text("⛔ Команда доступна только администраторам")
+            return
+
+        # Берём текст целиком, чтобы сохранить переносы строк
+        text = update.message.text.partition(' ')[2].strip()
+        if not text:
+            await update.message.reply_text("Укажите текст: /announce <текст объявления>")
+            return
+
+        user_ids = await async_db.get_user_ids()
+        status = await update.message.reply_text(
+            format_broadcast_status({'total': len(user_ids), 'sent': 0, 'failed': 0, 'retries': 0})
+        )
+
+        async def show_progress(stats):
+            await status.edit_text(format_broadcast_status(stats))
+
+        async def run_broadcast():
+            stats = await broadcaster.broadcast(
+                context.bot, user_ids, f"📣 {text}", on_progress=show_progress
+            )
+            await status.edit_text(format_broadcast_status(stats, finished=True))
+
+        # Рассылка идёт в фоне, не задерживая обработку других сообщений
+        context.application.create_task(run_broadcast(), update=update)
+    except Exception as e:
+        print(f"❌ ОШИБКА в announce_command: {e}")
+        import traceback
+        traceback.print_exc()
+        await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
+
+
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отмена действия: /cancel"""
+    context.user_data.pop('awaiting_import', None)
     await update.message.reply_text("❌ Действие отменено")
 
 
 async def all_lessons_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Вывод всех уроков подряд: /all"""
+    """Вывод всех уроков постранично: /all [страница]"""
     try:
-        all_lessons = db.get_all_lessons_sorted()
-        message = format_all_lessons_message(all_lessons)
-        await update.message.reply_text(message)
+        page = 1
+        if context.args:
+            if not context.args[0].isdigit() or int(context.args[0]) < 1:
+                await update.message.reply_text("❌ Укажите номер страницы: /all 2")
+                return
+            page = int(context.args[0])
+
+        # Текст страницы зависит только от версии расписания: при попадании
+        # в кэш базу не трогаем вовсе
+        version = await async_db.get_version()
+        message = render_cache.get('all', None, None, version, key=page)
+        if message is None:
+            all_lessons = await async_db.get_all_lessons_sorted()
+            pages = page_count(len(all_lessons))
+            page = min(page, pages)
+            # Форматируем только запрошенную страницу
+            start = (page - 1) * ALL_LESSONS_PAGE_SIZE
+            message = format_all_lessons_page(
+                all_lessons[start:start + ALL_LESSONS_PAGE_SIZE], page, pages, len(all_lessons)
+            )
+            render_cache.put('all', None, None, version, (), message, key=page)
+        await reply_long(update, message)
     except Exception as e:
         logging.error(f"Ошибка в all_lessons_command: {e}")
         await update.message.reply_text(f"❌ Ошибка при получении уроков: {str(e)}")
 
 
+async def find_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Поиск уроков по названию предмета: /find <запрос>"""
+    try:
+        query = ' '.join(context.args).strip()
+        if not query:
+            await update.message.reply_text("Укажите предмет: /find математика")
+            return
+
+        subgroup = get_user_subgroup(update.effective_user.id)
+        lessons = await async_db.search_lessons(query, subgroup)
+        await reply_long(update, format_search_results(query, lessons))
+    except Exception as e:
+        print(f"❌ ОШИБКА в find_command: {e}")
+        import traceback
+        traceback.print_exc()
+        await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
+
+
+async def conflicts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Пересечения уроков по времени: /conflicts [1|2|all]"""
+    try:
+        subgroup = context.args[0].lower() if context.args else 'all'
+        if subgroup not in VALID_SUBGROUPS:
+            await update.message.reply_text("❌ Некорректная подгруппа. Используйте: 1, 2 или all")
+            return
+
+        pairs = await async_db.get_conflicts(subgroup)
+        await reply_long(update, format_conflicts_report(pairs, subgroup))
+    except Exception as e:
+        print(f"❌ ОШИБКА в conflicts_command: {e}")
+        import traceback
+        traceback.print_exc()
+        await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
+
+
 async def clear_cache_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Очистка кэша: /clearcache"""
     try:
+        stats = schedule_cache.stats()
         clear_schedule_cache()
-        await update.message.reply_text("✅ Кэш расписания очищен")
+        await update.message.reply_text(
+            "✅ Кэш расписания очищен\n"
+            f"📈 Попаданий: {stats['hits']}, промахов: {stats['misses']}"
+        )
     except Exception as e:
         print(f"❌ ОШИБКА в clear_cache_command: {e}")
         import traceback
@@ -427,41 +648,243 @@ async def clear_cache_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
 
 
-# === ОБРАБОТЧИК ТЕКСТОВЫХ СООБЩЕНИЙ (для кнопок клавиатуры) ===
-async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик текстовых сообщений от кнопок клавиатуры"""
+# === ИМПОРТ И ЭКСПОРТ ===
+async def import_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Импорт уроков: /import, затем файл следующим сообщением"""
+    context.user_data['awaiting_import'] = True
+    await update.message.reply_text(get_import_instruction_message(IMPORT_MAX_MB))
+
+
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Файл после /import (или с подписью /import): все уроки одной записью в базу"""
     try:
-        text = update.message.text.lower()
-        user_id = update.effective_user.id
+        awaiting = context.user_data.pop('awaiting_import', False)
+        if not awaiting and not (update.message.caption or '').startswith('/import'):
+            return
 
-        if "сегодня" in text:
-            await today_command(update, context)
-        elif "завтра" in text:
-            await tomorrow_command(update, context)
-        elif "вся неделя" in text or "неделя" in text:
-            await week_command(update, context)
-        elif "добавить урок" in text:
-            await update.message.reply_text(get_add_instruction_message())
-        elif "удалить урок" in text:
-            await update.message.reply_text(
-                "🗑️ Для удаления урока используйте команду:\n"
-                "/delete <ID_урока>\n\n"
-                "Сначала посмотрите ID урока: /all"
+        document = update.message.document
+        fmt = detect_format(document.file_name or '')
+        if fmt is None:
+            await update.message.reply_text("❌ Неизвестный формат файла. Поддерживаются .csv, .json и .ics")
+            return
+        if document.file_size and document.file_size > IMPORT_MAX_MB * 1024 * 1024:
+            await update.message.reply_text(f"❌ Файл больше {IMPORT_MAX_MB} МБ")
+            return
+
+        buffer = io.BytesIO()
+        telegram_file = await document.get_file()
+        await telegram_file.download_to_memory(buffer)
+        buffer.seek(0)
+
+        # Разбор большого файла не должен задерживать цикл событий
+        lessons, errors, error_count = await asyncio.to_thread(import_lessons, buffer, fmt)
+        result = await async_db.add_lessons(lessons)
+        await reply_long(update, format_import_result(
+            len(result['lesson_ids']), errors, error_count, result.get('conflicts', 0)
+        ))
+    except ImportFormatError as e:
+        await update.message.reply_text(f"❌ Не удалось прочитать файл: {e}")
+    except Exception as e:
+        print(f"❌ ОШИБКА в import_document: {e}")
+        import traceback
+        traceback.print_exc()
+        await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выгрузка расписания файлом: /export [csv|json|ics]"""
+    try:
+        fmt = detect_format(context.args[0]) if context.args else 'csv'
+        if fmt not in EXPORT_FORMATS:
+            await update.message.reply_text("❌ Укажите формат: /export csv, /export json или /export ics")
+            return
+
+        lessons = await async_db.get_all_lessons_sorted()
+        file = await asyncio.to_thread(export_to_file, lessons, fmt)
+        with file:
+            await update.message.reply_document(
+                document=file, filename=f"schedule.{fmt}", caption=f"📦 Уроков: {len(lessons)}"
             )
-        elif "статистика" in text:
-            subgroup = get_user_subgroup(user_id)
-            stats = db.get_stats_for_subgroup(subgroup)
-            message = f"📊 Статистика для подгруппы {subgroup}:\n\n"
-            message += f"• Всего уроков: {stats['total_lessons']}\n"
-            message += f"• Дней с уроками: {stats['days_with_lessons']}\n"
-            message += f"• Разных предметов: {stats['subjects_count']}\n"
-            if stats['most_busy_day']:
-                message += f"• Самый загруженный день: {stats['most_busy_day']}"
-            await update.message.reply_text(message)
-        elif "помощь" in text or "❓" in text:
-            await help_command(update, context)
-        elif "подгруппа" in text:
-            await subgroup_command(update, context)
+    except Exception as e:
+        print(f"❌ ОШИБКА в export_command: {e}")
+        import traceback
+        traceback.print_exc()
+        await update.message.reply_text(f"❌ Ошибка: {str(e)[:100]}")
+
+
+# === INLINE-КНОПКИ ===
+DAY_BY_SLUG = {slug: day for day, slug in DAY_SLUGS.items()}
+
+
+async def edit_query_message(query, text: str, reply_markup=None, full_command: str = ''):
+    """Заменить текст сообщения с кнопками; слишком длинный текст сокращается"""
+    parts = split_message(text, MAX_MESSAGE_LENGTH - 100)
+    if len(parts) > 1:
+        text = parts[0] + f"\n\n✂️ Сообщение сокращено, полностью: /{full_command}"
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        # Повторное нажатие той же кнопки - текст не изменился
+        if 'not modified' not in str(e).lower():
+            raise
+
+
+async def schedule_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Нажатия inline-кнопок выбора дня, недели и подгруппы"""
+    query = update.callback_query
+    try:
+        kind, _, value = (query.data or '').partition(':')
+        user = query.from_user
+        subgroup = get_user_subgroup(user.id)
+
+        if kind == CALLBACK_DAY and value in DAY_BY_SLUG:
+            day = DAY_BY_SLUG[value]
+            text = await render_day_message(subgroup, day)
+            reply_markup = create_days_inline_keyboard(day)
+            full_command = day_command(day)
+        elif kind == CALLBACK_WEEK:
+            text = await render_week_message(subgroup)
+            reply_markup = create_days_inline_keyboard()
+            full_command = 'week'
+        elif kind == CALLBACK_SUBGROUP and value in VALID_SUBGROUPS:
+            set_user_subgroup(user.id, value, user)
+            text = f"✅ Выбрана подгруппа: 🎯 {value}"
+            reply_markup = create_subgroups_inline_keyboard(value)
+            full_command = 'subgroup'
+        else:
+            await query.answer("❌ Кнопка устарела")
+            return
+
+        await query.answer()
+        await edit_query_message(query, text, reply_markup, full_command)
+    except Exception as e:
+        print(f"❌ ОШИБКА в schedule_callback: {e}")
+        import traceback
+        traceback.print_exc()
+        await query.answer(f"❌ Ошибка: {str(e)[:100]}", show_alert=True)
+
+
+async def delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки ✅/❌ под подтверждением удаления: ответ заменяет само сообщение"""
+    query = update.callback_query
+    try:
+        kind, _, value = (query.data or '').partition(':')
+        if not value.isdigit():
+            await query.answer("❌ Кнопка устарела")
+            return
+        lesson_id = int(value)
+
+        if kind == CALLBACK_DELETE:
+            lesson = await async_db.delete_lesson_returning(lesson_id)
+            text = format_lesson_deleted_message(lesson) if lesson else "❌ Урок не найден"
+        else:
+            text = f"❌ Удаление урока #{lesson_id} отменено"
+
+        await query.answer()
+        await edit_query_message(query, text)
+    except Exception as e:
+        print(f"❌ ОШИБКА в delete_callback: {e}")
+        import traceback
+        traceback.print_exc()
+        await query.answer(f"❌ Ошибка: {str(e)[:100]}", show_alert=True)
+
+
+# === РЕЕСТР КОМАНД ДНЕЙ И ПОДГРУПП ===
+# Имя команды -> параметр общего обработчика; в main() регистрируются циклом
+DAY_COMMANDS = {day_command(day): day for day in DAYS_RU}
+SUBGROUP_COMMANDS = {f"subgroup_{subgroup}": subgroup for subgroup in VALID_SUBGROUPS}
+
+
+def with_argument(handler, argument):
+    """Обработчик команды с зафиксированным параметром (днём или подгруппой)"""
+    async def command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await handler(update, context, argument)
+    return command
+
+
+# === ОБРАБОТЧИКИ КНОПОК ===
+async def add_lesson_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(get_add_instruction_message())
+
+
+async def delete_lesson_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(
+        "🗑️ Для удаления урока используйте команду:\n"
+        "/delete <ID_урока>\n\n"
+        "Сначала посмотрите ID урока: /all"
+    )
+
+
+async def stats_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    subgroup = get_user_subgroup(update.effective_user.id)
+    stats = await async_db.get_stats_for_subgroup(subgroup)
+    await update.message.reply_text(format_stats_message(stats))
+
+
+async def main_menu_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    subgroup = get_user_subgroup(update.effective_user.id)
+    await update.message.reply_text("🏠 Главное меню", reply_markup=create_main_menu(subgroup))
+
+
+# === МАРШРУТИЗАЦИЯ ТЕКСТОВЫХ СООБЩЕНИЙ ===
+# Точное совпадение с подписью кнопки - один поиск в словаре
+TEXT_ROUTES = {
+    BUTTON_TODAY: today_command,
+    BUTTON_TOMORROW: tomorrow_command,
+    BUTTON_WEEK: week_command,
+    BUTTON_ADD: add_lesson_button,
+    BUTTON_DELETE: delete_lesson_button,
+    BUTTON_STATS: stats_button,
+    BUTTON_HELP: help_command,
+    BUTTON_HOME: main_menu_button,
+    BUTTON_FOR_ALL: with_argument(handle_subgroup_command, 'all'),
+}
+TEXT_ROUTES.update({label: subgroup_command for label in SUBGROUP_BUTTONS.values()})
+TEXT_ROUTES.update({day: with_argument(handle_day_command, day) for day in DAYS_RU})
+
+
+def normalize_text(text: str) -> str:
+    """Слова текста через пробел - так же, как их разбирает поиск /find"""
+    return ' '.join(normalize_subject(text))
+
+
+# Запасной вариант для свободного текста: подписи без эмодзи и ключевые слова
+NORMALIZED_ROUTES = {normalize_text(label): handler for label, handler in TEXT_ROUTES.items()}
+KEYWORD_ROUTES = {
+    'сегодня': today_command,
+    'завтра': tomorrow_command,
+    'неделя': week_command,
+    'статистика': stats_button,
+    'помощь': help_command,
+    'подгруппа': subgroup_command,
+}
+KEYWORD_ROUTES.update({normalize_text(day): with_argument(handle_day_command, day) for day in DAYS_RU})
+
+
+def route_text(text: str):
+    """Обработчик для текста сообщения или None"""
+    handler = TEXT_ROUTES.get(text.strip())
+    if handler is not None:
+        return handler
+
+    normalized = normalize_text(text)
+    handler = NORMALIZED_ROUTES.get(normalized)
+    if handler is not None:
+        return handler
+
+    for word in normalized.split():
+        handler = KEYWORD_ROUTES.get(word)
+        if handler is not None:
+            return handler
+    return None
+
+
+async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик текстовых сообщений от кнопок клавиатуры"""
+    try:
+        handler = route_text(update.message.text)
+        if handler is not None:
+            await handler(update, context)
         else:
             await update.message.reply_text(
                 "ℹ️ Используйте кнопки ниже или команды:\n"
@@ -476,6 +899,39 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         traceback.print_exc()
 
 
+def run_application(application: Application):
+    """Получать обновления через webhook или, по умолчанию, опросом"""
+    if BOT_MODE == 'webhook':
+        if not WEBHOOK_URL:
+            print("⚠️ BOT_MODE=webhook, но WEBHOOK_URL не задан - работаем опросом")
+        else:
+            secret = WEBHOOK_SECRET
+            if not secret:
+                # Несколько экземпляров за балансировщиком должны делить один секрет
+                secret = secrets.token_urlsafe(32)
+                print("⚠️ WEBHOOK_SECRET не задан - сгенерирован случайный на время запуска")
+
+            webhook_url = f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}"
+            print(f"🌐 Webhook: {webhook_url} (слушаем {WEBHOOK_LISTEN}:{WEBHOOK_PORT})")
+            application.run_webhook(
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=WEBHOOK_PATH,
+                webhook_url=webhook_url,
+                secret_token=secret,
+                drop_pending_updates=True,
+                close_loop=False
+            )
+            return
+
+    application.run_polling(
+        poll_interval=2.0,
+        timeout=15,
+        drop_pending_updates=True,
+        close_loop=False
+    )
+
+
 def main():
     """Запуск бота"""
     try:
@@ -485,7 +941,25 @@ def main():
         db.migrate_to_subgroups()
         print("✅ База данных обновлена для поддержки подгрупп")
 
-        application = Application.builder().token(TOKEN).build()
+        # Прогреваем кэш сразу для всех подгрупп одним проходом
+        fill_schedule_cache(db.get_weeks_for_subgroups(VALID_SUBGROUPS))
+
+        async def post_init(application: Application):
+            schedule_cache.attach(asyncio.get_running_loop())
+            await reminder_scheduler.start(functools.partial(broadcaster.broadcast, application.bot))
+
+        async def post_shutdown(application: Application):
+            await reminder_scheduler.stop()
+            schedule_cache.attach(None)
+
+        application = (
+            Application.builder()
+            .token(TOKEN)
+            .concurrent_updates(ChatOrderedUpdateProcessor(MAX_CONCURRENT))
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
 
         # === ГЛОБАЛЬНЫЙ ОБРАБОТЧИК ОШИБОК ===
         async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -513,28 +987,26 @@ def main():
             ("schedule", schedule_command),
             ("subgroup", subgroup_command),
             ("all", all_lessons_command),
+            ("find", find_command),
+            ("conflicts", conflicts_command),
             ("add", add_lesson_command),
+            ("update", update_lesson_command),
             ("delete", delete_lesson_command),
+            ("reminders", reminders_command),
+            ("announce", announce_command),
+            ("import", import_command),
+            ("export", export_command),
             ("clearcache", clear_cache_command),
             ("cancel", cancel_command),
         ]
 
-        # Регистрация команд ДНЕЙ
+        # Регистрация команд ДНЕЙ и ПОДГРУПП из реестра
         day_commands = [
-            ("day_monday", day_monday_command),
-            ("day_tuesday", day_tuesday_command),
-            ("day_wednesday", day_wednesday_command),
-            ("day_thursday", day_thursday_command),
-            ("day_friday", day_friday_command),
-            ("day_saturday", day_saturday_command),
-            ("day_sunday", day_sunday_command),
+            (command, with_argument(handle_day_command, day)) for command, day in DAY_COMMANDS.items()
         ]
-
-        # Регистрация команд ПОДГРУПП
         subgroup_commands = [
-            ("subgroup_1", subgroup_1_command),
-            ("subgroup_2", subgroup_2_command),
-            ("subgroup_all", subgroup_all_command),
+            (command, with_argument(handle_subgroup_command, subgroup))
+            for command, subgroup in SUBGROUP_COMMANDS.items()
         ]
 
         # Регистрируем все статические команды
@@ -548,6 +1020,20 @@ def main():
             confirm_delete_command
         ))
 
+        # Файлы для /import
+        application.add_handler(MessageHandler(filters.Document.ALL, import_document))
+
+        # Inline-кнопки выбора дня и подгруппы
+        application.add_handler(CallbackQueryHandler(
+            schedule_callback,
+            pattern=rf'^({CALLBACK_DAY}|{CALLBACK_WEEK}|{CALLBACK_SUBGROUP}):'
+        ))
+
+        application.add_handler(CallbackQueryHandler(
+            delete_callback,
+            pattern=rf'^({CALLBACK_DELETE}|{CALLBACK_DELETE_CANCEL}):\d+$'
+        ))
+
         # Регистрируем обработчик текстовых сообщений (для кнопок)
         application.add_handler(MessageHandler(
             filters.TEXT & ~filters.COMMAND,
@@ -560,12 +1046,7 @@ def main():
         print("\n📝 Напишите /start в Telegram")
         print("❓ Напишите /help для списка всех команд")
 
-        application.run_polling(
-            poll_interval=2.0,
-            timeout=15,
-            drop_pending_updates=True,
-            close_loop=False
-        )
+        run_application(application)
 
     except KeyboardInterrupt:
         print("\n👋 Бот остановлен")
@@ -573,6 +1054,9 @@ def main():
         print(f"❌ Критическая ошибка при запуске бота: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        async_db.close()
+        db.close()
 
 
 if __name__ == "__main__":
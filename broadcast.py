@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+# Лимиты Telegram: около 30 сообщений в секунду на бота и 1 в секунду в один чат
+BROADCAST_RATE = 30.0
+PER_CHAT_INTERVAL = 1.0
+BROADCAST_WORKERS = 8
+MAX_RETRIES = 3
+# Сколько раз повторять одно сообщение после 429, прежде чем сдаться
+MAX_RATE_LIMIT_RETRIES = 5
+
+
+class TokenBucket:
+    """Асинхронное ведро токенов: не больше rate операций в секунду"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        # capacity - допустимый всплеск; 1 означает ровный поток без пачек
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        # До этого момента (monotonic) ведро закрыто: Telegram попросил подождать
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Остановить выдачу токенов на seconds секунд (ответ 429)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self) -> None:
+        # Под блокировкой ждущие обслуживаются по очереди, без гонки за токены
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Broadcaster:
+    """Рассылка одного сообщения многим чатам в пределах лимитов Telegram.
+
+    Общее ведро токенов ограничивает скорость всех рассылок бота, отдельный
+    интервал - частоту сообщений в один чат. Отправляют workers параллельных
+    задач; на 429 (RetryAfter) вся рассылка ждёт указанное Telegram время и
+    повторяет сообщение (не больше max_rate_limit_retries раз), сетевые
+    ошибки повторяются до max_retries раз.
+    """
+
+    def __init__(self, rate: float = BROADCAST_RATE, per_chat_interval: float = PER_CHAT_INTERVAL,
+                 workers: int = BROADCAST_WORKERS, max_retries: int = MAX_RETRIES,
+                 max_rate_limit_retries: int = MAX_RATE_LIMIT_RETRIES):
+        self.bucket = TokenBucket(rate)
+        self.per_chat_interval = per_chat_interval
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_rate_limit_retries = max_rate_limit_retries
+        # Чат -> момент (monotonic), раньше которого ему писать нельзя
+        self._chat_ready: Dict[int, float] = {}
+        self.totals = {'sent': 0, 'failed': 0, 'retries': 0}
+
+    async def _wait_for_chat(self, chat_id: int) -> None:
+        now = time.monotonic()
+        ready = self._chat_ready.get(chat_id, 0.0)
+        self._chat_ready[chat_id] = max(now, ready) + self.per_chat_interval
+        if ready > now:
+            await asyncio.sleep(ready - now)
+
+    def _forget_idle_chats(self) -> None:
+        now = time.monotonic()
+        for chat_id in [c for c, ready in self._chat_ready.items() if ready <= now]:
+            del self._chat_ready[chat_id]
+
+    async def _send_one(self, bot: Any, chat_id: int, text: str, stats: Dict, **kwargs: Any) -> None:
+        attempt = 0
+        rate_limited = 0
+        while True:
+            await self._wait_for_chat(chat_id)
+            await self.bucket.acquire()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                stats['sent'] += 1
+                return
+            except RetryAfter as e:
+                # Не теряем сообщение: ждём, сколько сказал Telegram, и пробуем снова
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                self.bucket.pause(delay)
+                rate_limited += 1
+                if rate_limited > self.max_rate_limit_retries:
+                    # Чат, который раз за разом получает 429, не должен держать всю рассылку
+                    logging.error(f"Сообщение в чат {chat_id} не доставлено: Telegram ограничивает частоту")
+                    stats['failed'] += 1
+                    return
+                stats['retries'] += 1
+            except (Forbidden, BadRequest) as e:
+                # Бот заблокирован или чат не существует - повтор не поможет
+                logging.warning(f"Сообщение в чат {chat_id} не доставлено: {e}")
+                stats['failed'] += 1
+                return
+            except NetworkError as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    logging.error(f"Сообщение в чат {chat_id} не доставлено после повторов: {e}")
+                    stats['failed'] += 1
+                    return
+                stats['retries'] += 1
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                logging.error(f"Ошибка отправки в чат {chat_id}: {e}")
+                stats['failed'] += 1
+                return
+
+    async def broadcast(self, bot: Any, chat_ids: Iterable[Any], text: str,
+                        on_progress: Optional[Callable[[Dict], Awaitable[Any]]] = None,
+                        progress_every: int = 100, **kwargs: Any) -> Dict[str, Any]:
+        """Отправить text во все чаты chat_ids; вернуть статистику рассылки"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for chat_id in dict.fromkeys(int(chat_id) for chat_id in chat_ids):
+            queue.put_nowait(chat_id)
+        stats = {'total': queue.qsize(), 'sent': 0, 'failed': 0, 'retries': 0}
+        started = time.monotonic()
+
+        async def worker():
+            while True:
+                try:
+                    chat_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._send_one(bot, chat_id, text, stats, **kwargs)
+                done = stats['sent'] + stats['failed']
+                if on_progress is not None and done % progress_every == 0:
+                    try:
+                        await on_progress(dict(stats))
+                    except Exception as e:
+                        logging.error(f"Ошибка в обработчике прогресса рассылки: {e}")
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, stats['total']))))
+        self._forget_idle_chats()
+
+        stats['elapsed'] = round(time.monotonic() - started, 2)
+        for key in ('sent', 'failed', 'retries'):
+            self.totals[key] += stats[key]
+        logging.info(
+            f"Рассылка: отправлено {stats['sent']} из {stats['total']}, "
+            f"ошибок {stats['failed']}, повторов {stats['retries']}, {stats['elapsed']} с"
+        )
+        return stats
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple, Any
+
+
+class ScheduleCache:
+    """Кэш расписания по ключам (подгруппа, день) с отдельным TTL у каждого ключа.
+
+    Подписанный на изменения базы (см. on_change) кэш сбрасывает ровно
+    затронутые ключи, и TTL становится лишь страховкой (ttl=None - без срока).
+    После attach(loop) сброс выполняется в цикле событий, поэтому проверка
+    version и заполнение кэша в обработчике не разрываются сбросом.
+    """
+
+    def __init__(self, ttl: Optional[float] = 300):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, str], Tuple[float, List[Dict]]] = {}
+        # Версия расписания, изменения до которой кэш уже учёл
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """Выполнять сброс по изменениям базы в цикле loop (None - сразу в потоке базы)"""
+        self._loop = loop
+
+    @staticmethod
+    def _day_key(day: str) -> str:
+        return day.strip().capitalize()
+
+    def get(self, subgroup: str, day: str) -> Optional[List[Dict]]:
+        """Уроки из кэша или None, если ключа нет или он устарел"""
+        key = (str(subgroup), self._day_key(day))
+        entry = self._entries.get(key)
+        if entry is None or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, subgroup: str, day: str, lessons: List[Dict]) -> None:
+        self._entries[(str(subgroup), self._day_key(day))] = (time.monotonic(), lessons)
+
+    def invalidate(self, day: Optional[str] = None, subgroup: Optional[str] = None) -> None:
+        """Сбросить ключи, которые затрагивает изменение урока дня day подгруппы subgroup.
+
+        Урок для всех ('all') виден в каждой подгруппе, а урок подгруппы 1 или 2 -
+        в ней самой и в общем представлении 'all'. None означает «любой».
+        """
+        day_key = self._day_key(day) if day else None
+        if subgroup is None or str(subgroup) == 'all':
+            views = None
+        else:
+            views = {str(subgroup), 'all'}
+
+        for key in list(self._entries):
+            key_subgroup, key_day = key
+            if day_key is not None and key_day != day_key:
+                continue
+            if views is not None and key_subgroup not in views:
+                continue
+            self._entries.pop(key, None)
+
+    def on_change(self, change: Any) -> None:
+        """Подписчик базы; вызывается из потока базы, поэтому передаёт сброс в цикл"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._apply_change, change)
+        else:
+            self._apply_change(change)
+
+    def _apply_change(self, change: Any) -> None:
+        """Сбросить ключи, затронутые изменением ScheduleChange"""
+        if change.days is None or change.subgroups is None:
+            self.clear()
+        else:
+            for day in change.days:
+                for subgroup in change.subgroups:
+                    self.invalidate(day, subgroup)
+        self.version = max(self.version, change.version)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,124 @@
+import bisect
+import heapq
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from models import Lesson, Subgroup
+
+
+def _start(lesson: Lesson) -> int:
+    return lesson.start
+
+
+def lessons_overlap(first: Lesson, second: Lesson) -> bool:
+    """Пересекаются ли занятия по времени и видит ли их одна подгруппа"""
+    if first.subgroup is not Subgroup.ALL and second.subgroup is not Subgroup.ALL \
+            and first.subgroup != second.subgroup:
+        return False
+    return first.start < second.finish and second.start < first.finish
+
+
+class ConflictIndex:
+    """Пересечения занятий по времени.
+
+    Уроки каждого дня разложены по подгруппам в списки, отсортированные по
+    началу. Урок мешает другому, если их интервалы пересекаются и их видит
+    одна подгруппа: урок для всех пересекается с уроками любой подгруппы.
+    Урок, пересекающийся с [start, finish), начинается не раньше
+    start - (самое длинное занятие списка), поэтому проверка - два
+    бинарных поиска и проход по узкому окну, а не по всему дню.
+    """
+
+    def __init__(self):
+        # (день, подгруппа) -> уроки по началу; длительности - для ширины окна
+        self._buckets: Dict[Tuple[str, str], List[Lesson]] = {}
+        self._durations: Dict[Tuple[str, str], Counter] = {}
+
+    @staticmethod
+    def _key(lesson: Lesson) -> Tuple[str, str]:
+        return lesson.day_key, str(lesson.subgroup)
+
+    # ===== ИЗМЕНЕНИЯ =====
+    def add(self, lesson: Lesson) -> None:
+        if lesson.start is None:
+            return
+        key = self._key(lesson)
+        bisect.insort(self._buckets.setdefault(key, []), lesson, key=Lesson.sort_key)
+        self._durations.setdefault(key, Counter())[lesson.finish - lesson.start] += 1
+
+    def remove(self, lesson: Lesson) -> None:
+        if lesson.start is None:
+            return
+        key = self._key(lesson)
+        bucket = self._buckets[key]
+        i = bisect.bisect_left(bucket, lesson.sort_key(), key=Lesson.sort_key)
+        while bucket[i].id != lesson.id:
+            i += 1
+        del bucket[i]
+
+        durations = self._durations[key]
+        durations[lesson.finish - lesson.start] -= 1
+        if not durations[lesson.finish - lesson.start]:
+            del durations[lesson.finish - lesson.start]
+        if not bucket:
+            del self._buckets[key]
+            del self._durations[key]
+
+    # ===== ПОИСК =====
+    def _keys_for(self, lesson: Lesson) -> List[Tuple[str, str]]:
+        """Списки, уроки из которых видит та же подгруппа, что и lesson"""
+        if lesson.subgroup is Subgroup.ALL:
+            return [key for key in self._buckets if key[0] == lesson.day_key]
+        return [(lesson.day_key, str(lesson.subgroup)), (lesson.day_key, Subgroup.ALL.value)]
+
+    def find(self, lesson: Lesson) -> List[Lesson]:
+        """Уроки, пересекающиеся с lesson по времени (сам lesson не входит)"""
+        if lesson.start is None:
+            return []
+        found = []
+        for key in self._keys_for(lesson):
+            bucket = self._buckets.get(key)
+            if not bucket:
+                continue
+            longest = max(self._durations[key])
+            lo = bisect.bisect_right(bucket, lesson.start - longest, key=_start)
+            hi = bisect.bisect_left(bucket, lesson.finish, key=_start)
+            found.extend(
+                other for other in bucket[lo:hi]
+                if other.finish > lesson.start and other.id != lesson.id
+            )
+        found.sort(key=Lesson.sort_key)
+        return found
+
+    def conflicts(self, subgroup: str = 'all') -> List[Tuple[Lesson, Lesson]]:
+        """Все пары пересекающихся уроков, видимых подгруппе, по дням и времени"""
+        view = Subgroup.parse(subgroup)
+        days: Dict[str, List[List[Lesson]]] = {}
+        for (day, bucket_subgroup), bucket in self._buckets.items():
+            if view is Subgroup.ALL or bucket_subgroup in (Subgroup.ALL.value, view):
+                days.setdefault(day, []).append(bucket)
+
+        pairs = []
+        for buckets in days.values():
+            pairs.extend(self._sweep(heapq.merge(*buckets, key=Lesson.sort_key)))
+        pairs.sort(key=lambda pair: (pair[0].week_key(), pair[1].week_key()))
+        return pairs
+
+    @staticmethod
+    def _sweep(lessons: Iterable[Lesson]) -> Iterator[Tuple[Lesson, Lesson]]:
+        """Проход по урокам дня в порядке начала: сравниваем только с ещё идущими"""
+        active: List[Lesson] = []
+        for lesson in lessons:
+            active = [other for other in active if other.finish > lesson.start]
+            for other in active:
+                if lessons_overlap(other, lesson):
+                    yield other, lesson
+            active.append(lesson)
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    def clear(self) -> None:
+        self._buckets.clear()
+        self._durations.clear()
+
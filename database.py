@@ -1,12 +1,239 @@
+import bisect
+import functools
+import heapq
 import json
+import logging
 import os
+import secrets
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple, Callable, FrozenSet, Iterable, NamedTuple, Set
 
+from conflicts import ConflictIndex
+from models import Lesson, LessonError, Subgroup, canonical_lesson, day_key
+from search_index import SubjectIndex
+from stats import ScheduleStats
 
-class ScheduleDatabase:
-    def __init__(self, db_file: str = 'schedule.json'):
+
+DAYS_ORDER = {
+    'понедельник': 1, 'вторник': 2, 'среда': 3,
+    'четверг': 4, 'пятница': 5, 'суббота': 6, 'воскресенье': 7
+}
+
+JOURNAL_MAX_BYTES = 1024 * 1024
+JOURNAL_MAX_AGE = 300
+USERS_FLUSH_INTERVAL = 10.0
+USER_SETTING_KEYS = ('subgroup', 'notifications')
+DEFAULT_SUBGROUP = '1'
+VALID_SUBGROUPS = ['1', '2', 'all']
+
+
+def _create_temp_file(path: str) -> Tuple[int, str]:
+    """Новый временный файл рядом с path.
+
+    Права 0666 с учётом umask, как у open(): их применяет ядро, поэтому
+    umask процесса не приходится читать (и временно менять) из потоков.
+    """
+    while True:
+        tmp_path = f"{path}.{secrets.token_hex(6)}.tmp"
+        try:
+            return os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+
+class ScheduleChange(NamedTuple):
+    """Изменение расписания: новая версия и затронутые дни и подгруппы (None - всё)"""
+    version: int
+    days: Optional[FrozenSet[str]]
+    subgroups: Optional[FrozenSet[str]]
+
+
+class ChangeNotifier:
+    """Подписка на изменения расписания"""
+
+    def subscribe(self, callback: Callable[[ScheduleChange], None]) -> None:
+        """Вызывать callback(change) после каждого изменения расписания"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[ScheduleChange], None]) -> None:
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _notify(self, version: int, days: Optional[Iterable[str]] = None,
+                subgroups: Optional[Iterable[str]] = None) -> None:
+        change = ScheduleChange(
+            version,
+            frozenset(day.strip().capitalize() for day in days) if days is not None else None,
+            frozenset(str(subgroup) for subgroup in subgroups) if subgroups is not None else None
+        )
+        for callback in list(self._subscribers):
+            try:
+                callback(change)
+            except Exception as e:
+                logging.error(f"Ошибка в подписчике на изменения расписания: {e}")
+
+
+class UserSettingsBuffer:
+    """Отложенная (write-behind) запись настроек пользователей.
+
+    Выбор подгруппы и подписка на напоминания сразу попадают в компактные
+    карты в памяти, а на диск уходят пачкой раз в users_flush_interval
+    секунд или при close(). Наследник реализует _write_users(batch).
+    """
+
+    def _init_users_buffer(self, flush_interval: float) -> None:
+        self.users_flush_interval = flush_interval
+        self._users_lock = threading.Lock()
+        self._user_subgroups: Dict[str, str] = {}
+        self._notification_users: Set[str] = set()
+        self._user_ids: Set[str] = set()
+        self._pending_users: Dict[str, Dict] = {}
+        self._users_timer: Optional[threading.Timer] = None
+
+    @staticmethod
+    def _apply_user_settings(user_subgroups: Dict[str, str], notification_users: Set[str],
+                             user_id: str, changes: Dict) -> None:
+        if 'subgroup' in changes:
+            user_subgroups[user_id] = changes['subgroup']
+        if 'notifications' in changes:
+            if changes['notifications']:
+                notification_users.add(user_id)
+            else:
+                notification_users.discard(user_id)
+
+    def _reset_user_map(self, users: Dict[str, Dict]) -> None:
+        """Заменить карты настройками users с диска, сохранив ещё не записанное"""
+        user_subgroups: Dict[str, str] = {}
+        notification_users: Set[str] = set()
+        for user_id, settings in users.items():
+            self._apply_user_settings(user_subgroups, notification_users, user_id, settings)
+        with self._users_lock:
+            for user_id, pending in self._pending_users.items():
+                self._apply_user_settings(user_subgroups, notification_users, user_id, pending)
+            self._user_subgroups = user_subgroups
+            self._notification_users = notification_users
+            self._user_ids = set(users) | set(self._pending_users)
+
+    def _ensure_users_loaded(self) -> None:
+        """Наследник может лениво заполнить карты при первом обращении"""
+
+    def get_user_subgroup(self, user_id: Any) -> Optional[str]:
+        """Выбранная пользователем подгруппа или None"""
+        self._ensure_users_loaded()
+        return self._user_subgroups.get(str(user_id))
+
+    def get_user_notifications(self, user_id: Any) -> bool:
+        """Подписан ли пользователь на напоминания"""
+        self._ensure_users_loaded()
+        return str(user_id) in self._notification_users
+
+    def get_notification_users(self) -> Dict[str, str]:
+        """Подписчики напоминаний: user_id -> подгруппа"""
+        self._ensure_users_loaded()
+        with self._users_lock:
+            return {
+                user_id: self._user_subgroups.get(user_id, DEFAULT_SUBGROUP)
+                for user_id in self._notification_users
+            }
+
+    def get_user_ids(self) -> List[str]:
+        """Все известные боту пользователи"""
+        self._ensure_users_loaded()
+        with self._users_lock:
+            return list(self._user_ids)
+
+    def set_user_subgroup(self, user_id: Any, subgroup: str, **profile: Any) -> None:
+        """Запомнить подгруппу пользователя; запись на диск - отложенная"""
+        self._buffer_user_settings(user_id, {'subgroup': subgroup, **profile})
+
+    def set_user_notifications(self, user_id: Any, enabled: bool, **profile: Any) -> None:
+        """Включить или выключить напоминания; запись на диск - отложенная"""
+        self._buffer_user_settings(user_id, {'notifications': bool(enabled), **profile})
+
+    def _buffer_user_settings(self, user_id: Any, changes: Dict) -> None:
+        key = str(user_id)
+        with self._users_lock:
+            self._apply_user_settings(self._user_subgroups, self._notification_users, key, changes)
+            self._user_ids.add(key)
+            self._pending_users.setdefault(key, {}).update(changes)
+            if self._users_timer is None:
+                self._users_timer = threading.Timer(self.users_flush_interval, self.flush_users)
+                self._users_timer.daemon = True
+                self._users_timer.start()
+
+    def flush_users(self) -> int:
+        """Записать накопленные изменения пользователей одной операцией"""
+        with self._users_lock:
+            batch, self._pending_users = self._pending_users, {}
+            if self._users_timer is not None:
+                self._users_timer.cancel()
+                self._users_timer = None
+        if not batch:
+            return 0
+
+        try:
+            self._write_users(batch)
+        except Exception:
+            # Не теряем настройки: вернём их в буфер, более новые изменения важнее
+            with self._users_lock:
+                for user_id, pending in batch.items():
+                    self._pending_users[user_id] = {**pending, **self._pending_users.get(user_id, {})}
+            raise
+        return len(batch)
+
+    def _write_users(self, batch: Dict[str, Dict]) -> None:
+        raise NotImplementedError
+
+
+def synchronized(method):
+    """Выполнять метод под блокировкой базы: её вызывают из пула потоков"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class ScheduleDatabase(ChangeNotifier, UserSettingsBuffer):
+    def __init__(self, db_file: str = 'schedule.json', pretty: bool = False,
+                 journal: bool = False, journal_max_bytes: int = JOURNAL_MAX_BYTES,
+                 journal_max_age: float = JOURNAL_MAX_AGE,
+                 users_flush_interval: float = USERS_FLUSH_INTERVAL):
         self.db_file = db_file
+        # По умолчанию пишем компактный JSON; pretty=True - с отступами
+        self.pretty = pretty
+        # Режим журнала: мутации дописываются строкой в <db_file>.journal,
+        # а снимок перезаписывается только при компакции
+        self.journal = journal
+        self.journal_file = f"{db_file}.journal"
+        self.journal_max_bytes = journal_max_bytes
+        self.journal_max_age = journal_max_age
+        self._journal_seq = 0
+        self._journal_started: Optional[float] = None
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+        # Разобранное расписание держим в памяти и перечитываем файл,
+        # только если на диске изменились mtime или размер
+        self._data: Optional[Dict] = None
+        self._file_stamp: Optional[Tuple] = None
+        # Версия расписания: растёт при каждом изменении и перечитывании файла
+        self.version = 0
+        self._subscribers: List[Callable[[ScheduleChange], None]] = []
+        self._init_users_buffer(users_flush_interval)
+        # Индексы: id -> урок, день -> подгруппа -> уроки по времени
+        self._by_id: Dict[int, Lesson] = {}
+        self._by_day: Dict[str, Dict[str, List[Lesson]]] = {}
+        self._max_id = 0
+        # В файле есть уроки без подгруппы (старый формат)
+        self._missing_subgroups = False
+        # Слова названий предметов -> уроки (для /find)
+        self._subjects = SubjectIndex()
+        # Статистика по подгруппам, пересчитывается при каждом изменении
+        self._stats = ScheduleStats(VALID_SUBGROUPS)
+        # Уроки по дням и подгруппам для поиска пересечений по времени
+        self._conflicts = ConflictIndex()
         self.ensure_db_exists()
 
     def ensure_db_exists(self) -> None:
@@ -22,207 +249,566 @@ class ScheduleDatabase:
             }
             self._save_data(default_data)
 
-    def _load_data(self) -> Dict:
+    @staticmethod
+    def _stat_stamp(path: str) -> Optional[Tuple[int, int]]:
+        """Отпечаток файла: (mtime в наносекундах, размер)"""
         try:
-            with open(self.db_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.ensure_db_exists()
-            return self._load_data()
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _get_file_stamp(self) -> Tuple:
+        """Отпечаток снимка и журнала"""
+        journal_stamp = self._stat_stamp(self.journal_file) if self.journal else None
+        return self._stat_stamp(self.db_file), journal_stamp
+
+    def _load_data(self) -> Dict:
+        """Данные из памяти; файл перечитывается только если он изменился"""
+        with self._lock:
+            stamp = self._get_file_stamp()
+            if self._data is not None and stamp == self._file_stamp:
+                return self._data
+
+            try:
+                with open(self.db_file, 'r', encoding='utf-8') as f:
+                    self._data = json.load(f)
+            except FileNotFoundError:
+                self.ensure_db_exists()
+                return self._load_data()
+            except json.JSONDecodeError as e:
+                # Битый файл не перезаписываем: работаем с последней копией в памяти
+                logging.error(f"Файл {self.db_file} повреждён: {e}")
+                if self._data is None:
+                    raise
+                self._file_stamp = stamp
+                return self._data
+
+            self._file_stamp = stamp
+            self._rebuild_indexes()
+            if self.journal:
+                self._replay_journal()
+            # Файл изменили извне - неизвестно что именно, сообщаем обо всём
+            self._notify(self.version)
+            return self._data
 
     def _save_data(self, data: Dict) -> bool:
+        """Атомарная запись: временный файл, fsync и os.replace"""
         data['metadata']['last_modified'] = datetime.now().isoformat()
-        with open(self.db_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # Наибольший выданный id: после удаления последнего урока его id не
+        # выдаётся снова (как AUTOINCREMENT в SQLite), в том числе после перезапуска
+        data['metadata']['last_lesson_id'] = max(self._max_id, data['metadata'].get('last_lesson_id', 0))
+        if self.journal:
+            # Снимок помнит последнюю вошедшую в него запись журнала
+            data['metadata']['journal_seq'] = self._journal_seq
+        snapshot = data
+        if data is self._data:
+            # В памяти уроки живут только в индексах, список собираем для записи
+            snapshot = {'schedule': list(self._by_id.values()), **data}
+        if self.pretty:
+            payload = json.dumps(snapshot, indent=2, ensure_ascii=False, default=Lesson.to_dict)
+        else:
+            payload = json.dumps(snapshot, separators=(',', ':'), ensure_ascii=False,
+                                 default=Lesson.to_dict)
+
+        fd, tmp_path = _create_temp_file(os.path.abspath(self.db_file))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(self.db_file):
+                # Перезаписанный файл сохраняет прежние права
+                os.chmod(tmp_path, os.stat(self.db_file).st_mode)
+            os.replace(tmp_path, self.db_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if self.journal:
+            # Всё из журнала уже в снимке
+            open(self.journal_file, 'w', encoding='utf-8').close()
+            self._journal_started = None
+
+        # Записанные данные и есть актуальная копия в памяти
+        if data is not self._data:
+            self._data = data
+            self._rebuild_indexes()
+            self._notify(self.version)
+        self._file_stamp = self._get_file_stamp()
         return True
 
+    # ===== ЖУРНАЛ ИЗМЕНЕНИЙ =====
+    def _commit(self, op: Dict) -> None:
+        """Применить мутацию в памяти и сохранить её на диск"""
+        with self._lock:
+            data = self._load_data()
+            days, subgroups = self._apply_op(op)
+
+            try:
+                self._persist(op, data)
+            finally:
+                if days or subgroups:
+                    self._notify(self.version, days, subgroups)
+
+    def _persist(self, op: Dict, data: Dict) -> None:
+        """Записать мутацию: в журнал или полным снимком"""
+        if not self.journal:
+            self._save_data(data)
+            return
+
+        self._journal_seq += 1
+        op['seq'] = self._journal_seq
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(op, separators=(',', ':'), ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._file_stamp = self._get_file_stamp()
+
+        if self._journal_started is None:
+            self._journal_started = time.monotonic()
+        self._maybe_compact()
+
+    def _apply_op(self, op: Dict) -> Tuple[set, set]:
+        """Применить одну мутацию к данным в памяти и индексам.
+
+        Возвращает затронутые дни и подгруппы (до и после изменения).
+        """
+        kind = op['op']
+        if kind == 'users':
+            # Настройки пользователей не меняют расписание и его версию
+            self._apply_users(op['users'])
+            return set(), set()
+
+        self.version += 1
+        touched = []
+        if kind == 'add':
+            lesson = Lesson.from_dict(op['lesson'])
+            self._index_lesson(lesson)
+            touched.append(lesson)
+        elif kind == 'add_many':
+            for lesson in map(Lesson.from_dict, op['lessons']):
+                self._index_lesson(lesson)
+                touched.append(lesson)
+        elif kind == 'update':
+            lesson = self._by_id.get(op['id'])
+            if lesson is not None:
+                # Урок не меняем на месте, а заменяем новым: выданные
+                # читателям уроки не должны меняться у них в руках
+                updated = Lesson.from_dict(op['lesson'])
+                self._remove_from_day_index(lesson)
+                self._by_id[op['id']] = updated
+                self._add_to_day_index(updated)
+                self._subjects.add(updated)
+                self._stats.remove(lesson)
+                self._stats.add(updated)
+                self._conflicts.remove(lesson)
+                self._conflicts.add(updated)
+                touched.extend([lesson, updated])
+        elif kind == 'delete':
+            lesson = self._by_id.get(op['id'])
+            if lesson is not None:
+                self._unindex_lesson(lesson)
+                touched.append(lesson)
+        else:
+            logging.warning(f"Неизвестная операция в журнале: {kind}")
+
+        days = {lesson.get('day', '') for lesson in touched}
+        subgroups = {str(lesson.subgroup) for lesson in touched}
+        return days, subgroups
+
+    def _apply_users(self, batch: Dict[str, Dict]) -> None:
+        """Перенести выбор пользователей в раздел users"""
+        users = self._data.setdefault('users', {})
+        now = datetime.now().isoformat()
+        for user_id, changes in batch.items():
+            user = users.setdefault(user_id, {
+                'registered_at': now,
+                'settings': {'notifications': False, 'timezone': 'UTC+3'}
+            })
+            settings = user.setdefault('settings', {})
+            for key, value in changes.items():
+                if key in USER_SETTING_KEYS:
+                    settings[key] = value
+                elif value is not None:
+                    user[key] = value
+            user['last_activity'] = now
+
+            # При накатке журнала карты в памяти ещё не знают об этих изменениях
+            with self._users_lock:
+                self._user_ids.add(user_id)
+                if user_id not in self._pending_users:
+                    self._apply_user_settings(self._user_subgroups, self._notification_users,
+                                              user_id, changes)
+
+    def _replay_journal(self) -> None:
+        """Накатить на снимок записи журнала, которых в нём ещё нет"""
+        self._journal_seq = self._data['metadata'].get('journal_seq', 0)
+        self._journal_started = None
+        good_offset = 0
+        try:
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError("запись не дописана")
+                        op = json.loads(line)
+                    except ValueError:
+                        # Оборванная последняя запись после сбоя
+                        logging.warning(f"Пропущена повреждённая запись журнала {self.journal_file}")
+                        break
+                    good_offset += len(line)
+                    if op.get('seq', 0) <= self._journal_seq:
+                        continue
+                    self._apply_op(op)
+                    self._journal_seq = op['seq']
+                    if self._journal_started is None:
+                        self._journal_started = time.monotonic()
+                else:
+                    return
+        except FileNotFoundError:
+            return
+
+        # Обрезаем журнал до последней целой записи, иначе следующая
+        # запись приклеится к обрывку и пропадёт при следующей накатке
+        with open(self.journal_file, 'r+b') as f:
+            f.truncate(good_offset)
+            f.flush()
+            os.fsync(f.fileno())
+        self._file_stamp = self._get_file_stamp()
+
+    def _maybe_compact(self) -> None:
+        """Запустить фоновую компакцию, если журнал вырос или устарел"""
+        size = os.path.getsize(self.journal_file)
+        age = time.monotonic() - self._journal_started
+        if size < self.journal_max_bytes and age < self.journal_max_age:
+            return
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(
+            target=self.compact, name='schedule-compaction', daemon=True
+        )
+        self._compaction_thread.start()
+
+    @synchronized
+    def compact(self) -> None:
+        """Свернуть журнал в снимок schedule.json"""
+        if not self.journal or self._journal_started is None:
+            return
+        self._save_data(self._load_data())
+        logging.info(f"Журнал {self.journal_file} свёрнут в снимок")
+
+    def close(self) -> None:
+        """Записать отложенные настройки, дождаться компакции и свернуть журнал"""
+        self.flush_users()
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        self.compact()
+
+    # ===== ИНДЕКСЫ =====
+    def _rebuild_indexes(self) -> None:
+        """Полностью перестроить индексы по текущим данным"""
+        self.version += 1
+        self._by_id = {}
+        self._by_day = {}
+        self._max_id = self._data.get('metadata', {}).get('last_lesson_id', 0)
+        self._subjects = SubjectIndex()
+        self._stats = ScheduleStats(VALID_SUBGROUPS)
+        self._conflicts = ConflictIndex()
+        # Уроки из файла разбираются один раз и дальше живут в индексах:
+        # правка урока не перестраивает список, он собирается только при записи
+        raw_schedule = self._data.pop('schedule', [])
+        self._missing_subgroups = any(
+            'subgroup' not in lesson for lesson in raw_schedule if not isinstance(lesson, Lesson)
+        )
+        schedule = [Lesson.from_dict(lesson) for lesson in raw_schedule]
+        for lesson in sorted(schedule, key=lambda x: x.id):
+            self._index_lesson(lesson)
+        unparsed = sum(1 for lesson in schedule if lesson.start is None or lesson.weekday is None)
+        if unparsed:
+            logging.warning(f"В {self.db_file} уроков с неразобранным временем или днём: {unparsed}")
+
+        self._reset_user_map({
+            user_id: user.get('settings', {})
+            for user_id, user in self._data.get('users', {}).items()
+        })
+
+    def _index_lesson(self, lesson: Lesson) -> None:
+        self._by_id[lesson.id] = lesson
+        self._max_id = max(self._max_id, lesson.id)
+        self._add_to_day_index(lesson)
+        self._subjects.add(lesson)
+        self._stats.add(lesson)
+        self._conflicts.add(lesson)
+
+    def _unindex_lesson(self, lesson: Lesson) -> None:
+        self._by_id.pop(lesson.id, None)
+        self._remove_from_day_index(lesson)
+        self._subjects.remove(lesson.id)
+        self._stats.remove(lesson)
+        self._conflicts.remove(lesson)
+
+    def _add_to_day_index(self, lesson: Lesson) -> None:
+        bucket = self._by_day.setdefault(lesson.day_key, {}).setdefault(str(lesson.subgroup), [])
+        bisect.insort(bucket, lesson, key=Lesson.sort_key)
+
+    def _remove_from_day_index(self, lesson: Lesson) -> None:
+        day_key = lesson.day_key
+        subgroup_key = str(lesson.subgroup)
+        bucket = self._by_day[day_key][subgroup_key]
+        i = bisect.bisect_left(bucket, lesson.sort_key(), key=Lesson.sort_key)
+        while bucket[i] is not lesson:
+            i += 1
+        del bucket[i]
+
+        if not bucket:
+            del self._by_day[day_key][subgroup_key]
+            if not self._by_day[day_key]:
+                del self._by_day[day_key]
+
+    # ===== ПОЛЬЗОВАТЕЛИ =====
+    def _ensure_users_loaded(self) -> None:
+        if self._data is None:
+            # Карты заполняются при первом чтении файла; дальше - без блокировки
+            with self._lock:
+                self._load_data()
+
+    def _write_users(self, batch: Dict[str, Dict]) -> None:
+        self._commit({'op': 'users', 'users': batch})
+
     # ===== ОСНОВНЫЕ МЕТОДЫ =====
+    @synchronized
+    def get_version(self) -> int:
+        """Версия расписания: меняется при любом изменении, в том числе извне"""
+        self._load_data()
+        return self.version
+
+    @synchronized
     def add_lesson(self, lesson_data: Dict) -> Dict:
-        """Добавить урок с подгруппой"""
-        data = self._load_data()
-        lesson_id = max([l.get('id', 0) for l in data['schedule']], default=0) + 1
+        """Добавить урок с подгруппой; время и день приводятся к каноничному виду"""
+        try:
+            lesson_data = canonical_lesson(lesson_data)
+        except LessonError as e:
+            return {'success': False, 'error': str(e)}
+
+        self._load_data()
+        lesson_id = self._max_id + 1
 
         lesson_data['id'] = lesson_id
         lesson_data['created_at'] = datetime.now().isoformat()
-        lesson_data['subgroup'] = lesson_data.get('subgroup', 'all')
 
-        data['schedule'].append(lesson_data)
-        self._save_data(data)
+        self._commit({'op': 'add', 'lesson': lesson_data})
         return {'success': True, 'lesson_id': lesson_id}
 
-    def delete_lesson(self, lesson_id: int) -> bool:
-        data = self._load_data()
-        original_len = len(data['schedule'])
-        data['schedule'] = [l for l in data['schedule'] if l.get('id') != lesson_id]
+    @synchronized
+    def add_lessons(self, lessons: List[Dict]) -> Dict:
+        """Добавить много уроков одной записью на диск (импорт); некорректный урок отменяет всё"""
+        try:
+            lessons = [canonical_lesson(lesson_data) for lesson_data in lessons]
+        except LessonError as e:
+            return {'success': False, 'error': str(e)}
 
-        if len(data['schedule']) < original_len:
-            self._save_data(data)
-            return True
-        return False
+        self._load_data()
+        if not lessons:
+            return {'success': True, 'lesson_ids': [], 'conflicts': 0}
 
-    def get_all_lessons(self) -> List[Dict]:
-        """Получить все уроки из базы"""
-        data = self._load_data()
-        return sorted(data.get('schedule', []), key=lambda x: x.get('id', 0))
+        now = datetime.now().isoformat()
+        lesson_ids = []
+        for lesson_id, lesson_data in enumerate(lessons, self._max_id + 1):
+            lesson_data['id'] = lesson_id
+            lesson_data['created_at'] = now
+            lesson_ids.append(lesson_id)
 
-    def get_lesson_by_id(self, lesson_id: int) -> Optional[Dict]:
-        for lesson in self.get_all_lessons():
-            if lesson.get('id') == lesson_id:
-                return lesson
-        return None
+        self._commit({'op': 'add_many', 'lessons': lessons})
+        # Каждый новый урок проверяется по индексу - O(log n) на урок
+        conflicts = sum(1 for lesson_id in lesson_ids if self._conflicts.find(self._by_id[lesson_id]))
+        return {'success': True, 'lesson_ids': lesson_ids, 'conflicts': conflicts}
 
-    def update_lesson(self, lesson_id: int, updated_data: Dict) -> bool:
-        """Обновить данные урока"""
-        data = self._load_data()
+    @synchronized
+    def delete_lesson(self, lesson_id: int) -> bool:
+        return self.delete_lesson_returning(lesson_id) is not None
 
-        for i, lesson in enumerate(data['schedule']):
-            if lesson.get('id') == lesson_id:
-                # Сохраняем системные поля
-                updated_data['id'] = lesson_id
-                updated_data['created_at'] = lesson.get('created_at')
-                updated_data['updated_at'] = datetime.now().isoformat()
-                if 'subgroup' not in updated_data:
-                    updated_data['subgroup'] = lesson.get('subgroup', 'all')
+    @synchronized
+    def delete_lesson_returning(self, lesson_id: int) -> Optional[Lesson]:
+        """Удалить урок за одно чтение базы и вернуть его (None - урока нет)"""
+        self._load_data()
+        lesson = self._by_id.get(lesson_id)
+        if lesson is None:
+            return None
 
-                data['schedule'][i] = updated_data
-                self._save_data(data)
-                return True
-        return False
+        self._commit({'op': 'delete', 'id': lesson_id})
+        return lesson
 
-    # ===== МЕТОДЫ ДЛЯ ПОДГРУПП =====
-    def _lesson_matches_subgroup(self, lesson: Dict, subgroup: str) -> bool:
-        """Проверяет, подходит ли урок для данной подгруппы"""
-        lesson_subgroup = lesson.get('subgroup', 'all')
+    @synchronized
+    def get_all_lessons(self) -> List[Lesson]:
+        """Получить все уроки из базы"""
+        self._load_data()
+        # id выдаются по возрастанию, поэтому индекс уже упорядочен
+        return list(self._by_id.values())
+
+    @synchronized
+    def get_last_lesson_id(self) -> int:
+        """Наибольший когда-либо выданный id урока (удалённые тоже считаются)"""
+        self._load_data()
+        return self._max_id
+
+    @synchronized
+    def get_users(self) -> Dict[str, Dict]:
+        """Записи пользователей из раздела users (с уже записанными настройками)"""
+        return dict(self._load_data().get('users', {}))
+
+    @synchronized
+    def get_lesson_by_id(self, lesson_id: int) -> Optional[Lesson]:
+        self._load_data()
+        return self._by_id.get(lesson_id)
+
+    @synchronized
+    def update_lesson(self, lesson_id: int, updated_data: Dict) -> Dict:
+        """Обновить данные урока; без подгруппы урок остаётся в прежней"""
+        self._load_data()
+        lesson = self._by_id.get(lesson_id)
+        if lesson is None:
+            return {'success': False, 'error': f"урок с ID {lesson_id} не найден", 'not_found': True}
 
-        if subgroup == 'all' or lesson_subgroup == 'all':
-            return True
+        try:
+            updated_data = canonical_lesson({'subgroup': str(lesson.subgroup), **updated_data})
+        except LessonError as e:
+            return {'success': False, 'error': str(e)}
+        # Сохраняем системные поля
+        updated_data['id'] = lesson_id
+        updated_data['created_at'] = lesson.get('created_at')
+        updated_data['updated_at'] = datetime.now().isoformat()
 
-        return str(lesson_subgroup) == str(subgroup)
+        self._commit({'op': 'update', 'id': lesson_id, 'lesson': updated_data})
+        return {'success': True}
 
-    def _time_to_minutes(self, time_str: str) -> int:
-        """Конвертирует время в минуты для сортировки"""
-        try:
-            if ':' in time_str:
-                hours, minutes = map(int, time_str.split(':'))
-                return hours * 60 + minutes
-            return 0
-        except (ValueError, TypeError):
-            return 0
+    # ===== МЕТОДЫ ДЛЯ ПОДГРУПП =====
+    def _lesson_matches_subgroup(self, lesson: Lesson, subgroup: str) -> bool:
+        """Проверяет, подходит ли урок для данной подгруппы"""
+        return lesson.matches_subgroup(Subgroup.parse(subgroup))
 
-    def get_lessons_by_day_and_subgroup(self, day: str, subgroup: str = 'all') -> List[Dict]:
+    @synchronized
+    def get_lessons_by_day_and_subgroup(self, day: str, subgroup: str = 'all') -> List[Lesson]:
         """Получить уроки для конкретного дня и подгруппы"""
-        day_normalized = day.strip().lower()
-        lessons = [
-            lesson for lesson in self.get_all_lessons()
-            if lesson.get('day', '').strip().lower() == day_normalized
-               and self._lesson_matches_subgroup(lesson, subgroup)
+        self._load_data()
+        buckets = self._day_buckets(self._by_day.get(day_key(day), {}), subgroup)
+
+        if len(buckets) == 1:
+            return list(buckets[0])
+        # Корзины уже отсортированы по времени - достаточно слить их
+        return list(heapq.merge(*buckets, key=Lesson.sort_key))
+
+    @staticmethod
+    def _day_buckets(day_index: Dict[str, List[Lesson]], subgroup: str) -> List[List[Lesson]]:
+        """Корзины дня, подходящие для подгруппы"""
+        if subgroup == 'all':
+            return list(day_index.values())
+        return [
+            bucket for key, bucket in day_index.items()
+            if key in ('all', str(subgroup))
         ]
-        return sorted(lessons, key=lambda x: self._time_to_minutes(x.get('time', '')))
 
+    @synchronized
     def get_all_days_with_lessons_for_subgroup(self, subgroup: str = 'all') -> List[str]:
         """Получить все дни недели с уроками для указанной подгруппы"""
-        days_order = {
-            'понедельник': 1, 'вторник': 2, 'среда': 3,
-            'четверг': 4, 'пятница': 5, 'суббота': 6, 'воскресенье': 7
+        self._load_data()
+        days_set = {
+            day for day, day_index in self._by_day.items()
+            if day and self._day_buckets(day_index, subgroup)
         }
 
-        days_set = set()
-        for lesson in self.get_all_lessons():
-            if self._lesson_matches_subgroup(lesson, subgroup):
-                day = lesson.get('day', '').strip()
-                if day:
-                    days_set.add(day.lower())
-
         sorted_days = sorted(
             list(days_set),
-            key=lambda x: days_order.get(x, 99)
+            key=lambda x: DAYS_ORDER.get(x, 99)
         )
         return [day.capitalize() for day in sorted_days]
 
+    @synchronized
+    def get_weeks_for_subgroups(self, subgroups: List[str]) -> Dict[str, Dict[str, List[Lesson]]]:
+        """Расписание на неделю сразу для нескольких подгрупп за один проход по индексу"""
+        self._load_data()
+        weeks = {subgroup: {} for subgroup in subgroups}
+
+        for day in sorted(self._by_day, key=lambda x: DAYS_ORDER.get(x, 99)):
+            if not day:
+                continue
+            day_index = self._by_day[day]
+            for subgroup in subgroups:
+                buckets = self._day_buckets(day_index, subgroup)
+                if buckets:
+                    weeks[subgroup][day.capitalize()] = list(heapq.merge(*buckets, key=Lesson.sort_key))
+        return weeks
+
+    def get_week_for_subgroup(self, subgroup: str = 'all') -> Dict[str, List[Lesson]]:
+        """Расписание подгруппы на неделю: {день: уроки по времени}"""
+        return self.get_weeks_for_subgroups([subgroup])[subgroup]
+
+    @synchronized
     def get_stats_for_subgroup(self, subgroup: str = 'all') -> Dict[str, Any]:
-        """Статистика по расписанию для указанной подгруппы"""
-        lessons = [
-            lesson for lesson in self.get_all_lessons()
-            if self._lesson_matches_subgroup(lesson, subgroup)
-        ]
-
-        if not lessons:
-            return {
-                'total_lessons': 0,
-                'days_with_lessons': 0,
-                'subjects_count': 0,
-                'subgroup': subgroup
-            }
-
-        days_count = {}
-        subjects_set = set()
-
-        for lesson in lessons:
-            day = lesson.get('day', 'Не указан')
-            days_count[day] = days_count.get(day, 0) + 1
-            subjects_set.add(lesson.get('subject', ''))
-
-        return {
-            'total_lessons': len(lessons),
-            'days_with_lessons': len(days_count),
-            'subjects_count': len(subjects_set),
-            'lessons_by_day': days_count,
-            'most_busy_day': max(days_count, key=days_count.get) if days_count else None,
-            'subgroup': subgroup
-        }
+        """Статистика по расписанию для указанной подгруппы (из готовых агрегатов)"""
+        self._load_data()
+        if not self._stats.has_view(subgroup):
+            self._stats.add_view(subgroup, self._by_id.values())
+        return self._stats.get(subgroup)
+
+    # ===== ПЕРЕСЕЧЕНИЯ ПО ВРЕМЕНИ =====
+    @synchronized
+    def find_conflicts(self, lesson_id: int) -> List[Lesson]:
+        """Уроки, которые идут одновременно с уроком lesson_id у той же подгруппы"""
+        self._load_data()
+        lesson = self._by_id.get(lesson_id)
+        return self._conflicts.find(lesson) if lesson is not None else []
+
+    @synchronized
+    def get_conflicts(self, subgroup: str = 'all') -> List[Tuple[Lesson, Lesson]]:
+        """Все пары пересекающихся уроков, которые видит подгруппа"""
+        self._load_data()
+        return self._conflicts.conflicts(subgroup)
 
     # ===== ДОПОЛНИТЕЛЬНЫЕ МЕТОДЫ =====
-    def search_lessons(self, query: str, subgroup: str = 'all') -> List[Dict]:
-        """Поиск уроков по названию предмета"""
-        query = query.lower().strip()
+    @synchronized
+    def search_lessons(self, query: str, subgroup: str = 'all', fuzzy: bool = True) -> List[Lesson]:
+        """Поиск уроков по словам названия предмета (с началом слов и опечатками)"""
+        self._load_data()
         return [
-            lesson for lesson in self.get_all_lessons()
-            if query in lesson.get('subject', '').lower()
-               and self._lesson_matches_subgroup(lesson, subgroup)
+            lesson for lesson in self._subjects.search(query, fuzzy)
+            if self._lesson_matches_subgroup(lesson, subgroup)
         ]
 
+    @synchronized
     def get_all_subgroups(self) -> List[str]:
         """Получить все существующие подгруппы"""
-        subgroups = {lesson.get('subgroup', 'all') for lesson in self.get_all_lessons()}
+        subgroups = {str(lesson.subgroup) for lesson in self.get_all_lessons()}
         return sorted(list(subgroups))
 
-    def get_lessons_by_subgroup(self, subgroup: str) -> List[Dict]:
+    @synchronized
+    def get_lessons_by_subgroup(self, subgroup: str) -> List[Lesson]:
         """Получить все уроки для указанной подгруппы"""
         return [
             lesson for lesson in self.get_all_lessons()
             if self._lesson_matches_subgroup(lesson, subgroup)
         ]
 
+    @synchronized
     def migrate_to_subgroups(self) -> bool:
         """Миграция старых данных (без подгрупп) к новому формату"""
         data = self._load_data()
-        changed = False
-
-        for lesson in data['schedule']:
-            if 'subgroup' not in lesson:
-                lesson['subgroup'] = 'all'
-                changed = True
-
-        if changed:
+        # Уроку без подгруппы Lesson уже подставил 'all' - осталось записать её в файл
+        if self._missing_subgroups:
+            self._missing_subgroups = False
             self._save_data(data)
+            self._notify(self.version)
         return True
 
     # ===== МЕТОДЫ ДЛЯ СОРТИРОВКИ (для команды /all) =====
-    def get_all_lessons_sorted(self) -> List[Dict]:
+    @synchronized
+    def get_all_lessons_sorted(self) -> List[Lesson]:
         """Получить все уроки, отсортированные по дню и времени"""
-        days_order = {
-            'понедельник': 1, 'вторник': 2, 'среда': 3,
-            'четверг': 4, 'пятница': 5, 'суббота': 6, 'воскресенье': 7
-        }
-
-        lessons = self.get_all_lessons()
-        return sorted(lessons, key=lambda x: (
-            days_order.get(x.get('day', '').lower(), 99),
-            self._time_to_minutes(x.get('time', ''))
-        ))
+        return sorted(self.get_all_lessons(), key=Lesson.week_key)
 
     # ===== МЕТОДЫ ДЛЯ СОВМЕСТИМОСТИ =====
-    def get_lessons_by_day(self, day: str) -> List[Dict]:
+    def get_lessons_by_day(self, day: str) -> List[Lesson]:
         return self.get_lessons_by_day_and_subgroup(day, 'all')
 
     def get_all_days_with_lessons(self) -> List[str]:
@@ -0,0 +1,319 @@
+import csv
+import io
+import itertools
+import json
+import re
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from models import DAY_NAMES, DEFAULT_LESSON_MINUTES, Lesson, LessonError, normalize_lesson
+
+# Форматы по расширению файла
+FORMATS = {'csv': 'csv', 'json': 'json', 'jsonl': 'json', 'ics': 'ics', 'ical': 'ics'}
+EXPORT_FORMATS = ('csv', 'json', 'ics')
+MAX_IMPORT_ERRORS = 20
+# Выгрузка держится в памяти, пока не превысит этот размер, затем уходит на диск
+EXPORT_SPOOL_BYTES = 1024 * 1024
+# Длительность пары по умолчанию для событий календаря
+ICAL_DURATION = 'PT1H30M'
+
+CSV_FIELDS = ['subject', 'time', 'day', 'subgroup', 'end']
+CSV_HEADER_ALIASES = {
+    'subject': 'subject', 'предмет': 'subject',
+    'time': 'time', 'время': 'time',
+    'day': 'day', 'день': 'day',
+    'subgroup': 'subgroup', 'подгруппа': 'subgroup',
+    'end': 'end', 'конец': 'end',
+    'duration': 'duration', 'длительность': 'duration',
+}
+ICAL_DAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+
+class ImportFormatError(ValueError):
+    """Файл не удаётся разобрать как расписание"""
+
+
+def detect_format(name: str) -> Optional[str]:
+    """Формат по имени файла или расширению: 'csv', 'json', 'ics' или None"""
+    return FORMATS.get(name.rsplit('.', 1)[-1].strip().lower())
+
+
+# ===== ПРОВЕРКА ЗАПИСЕЙ =====
+def validate_lesson(raw: Dict[str, Any]) -> Tuple[Optional[Dict], Optional[str]]:
+    """Урок в каноничном виде или текст ошибки"""
+    try:
+        return normalize_lesson(raw), None
+    except LessonError as e:
+        return None, str(e)
+
+
+def import_lessons(stream: IO[bytes], fmt: str) -> Tuple[List[Dict], List[str], int]:
+    """Разобрать поток: (корректные уроки, первые ошибки, всего ошибок)"""
+    parsers = {'csv': parse_csv, 'json': parse_json, 'ics': parse_ical}
+    if fmt not in parsers:
+        raise ImportFormatError(f"неизвестный формат '{fmt}'")
+
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    lessons, errors, error_count = [], [], 0
+    try:
+        for position, raw in parsers[fmt](text):
+            lesson, error = validate_lesson(raw)
+            if lesson is not None:
+                lessons.append(lesson)
+                continue
+            error_count += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append(f"{position}: {error}")
+    except UnicodeDecodeError:
+        raise ImportFormatError("файл должен быть в кодировке UTF-8")
+    return lessons, errors, error_count
+
+
+# ===== CSV =====
+def parse_csv(stream: IO[str]) -> Iterator[Tuple[str, Dict]]:
+    """Строки CSV по одной; разделитель - запятая, точка с запятой или табуляция"""
+    first_line = stream.readline()
+    if not first_line.strip():
+        return
+    delimiter = max(',;\t', key=first_line.count)
+    reader = csv.reader(itertools.chain([first_line], stream), delimiter=delimiter)
+
+    header = next(reader)
+    fields = [CSV_HEADER_ALIASES.get(name.strip().lower()) for name in header]
+    rows: Iterable[List[str]] = reader
+    if 'subject' not in fields:
+        # Без заголовка: предмет, время, день, подгруппа, конец
+        fields = CSV_FIELDS
+        rows = itertools.chain([header], reader)
+
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield f"строка {reader.line_num}", {
+            field: value for field, value in zip(fields, row) if field
+        }
+
+
+# ===== JSON =====
+def _iter_json_array(stream: IO[str], buffer: str, chunk_size: int = 65536) -> Iterator[Any]:
+    """Элементы JSON-массива по одному, не загружая файл целиком"""
+    decoder = json.JSONDecoder()
+    pos = buffer.index('[') + 1
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            if pos >= len(buffer):
+                raise ValueError
+            item, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if eof:
+                raise ImportFormatError("JSON-массив оборван или повреждён")
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        buffer, pos = buffer[end:], 0
+
+
+def parse_json(stream: IO[str]) -> Iterator[Tuple[str, Dict]]:
+    """JSON-массив уроков, JSON Lines или резервная копия {"schedule": [...]}"""
+    buffer = ''
+    while not buffer.strip():
+        chunk = stream.read(4096)
+        if not chunk:
+            return
+        buffer += chunk
+
+    try:
+        if buffer.lstrip().startswith('['):
+            items = _iter_json_array(stream, buffer)
+        else:
+            first_line, _, rest = buffer.partition('\n')
+            try:
+                first = json.loads(first_line)
+            except ValueError:
+                first = None
+            if isinstance(first, dict) and 'schedule' not in first:
+                # JSON Lines: по объекту на строку
+                lines = itertools.chain([first_line], io.StringIO(rest), stream)
+                items = (json.loads(line) for line in lines if line.strip())
+            else:
+                data = json.loads(buffer + stream.read())
+                items = iter(data.get('schedule', []) if isinstance(data, dict) else [])
+
+        for number, item in enumerate(items, 1):
+            if not isinstance(item, dict):
+                yield f"запись {number}", {}
+                continue
+            yield f"запись {number}", item
+    except ValueError as e:
+        if isinstance(e, ImportFormatError):
+            raise
+        raise ImportFormatError(f"некорректный JSON: {e}")
+
+
+# ===== iCal =====
+def _unfold_ical(stream: IO[str]) -> Iterator[str]:
+    """Склеить перенесённые строки iCal (продолжение начинается с пробела)"""
+    current = None
+    for line in stream:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _ical_unescape(value: str) -> str:
+    return re.sub(r'\\([\\;,nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def parse_ical(stream: IO[str]) -> Iterator[Tuple[str, Dict]]:
+    """События VEVENT: день и время из DTSTART (или BYDAY правила повторения).
+
+    Время берётся как записано в календаре, без перевода часовых поясов.
+    """
+    event: Optional[Dict[str, str]] = None
+    number = 0
+    for line in _unfold_ical(stream):
+        name_part, _, value = line.partition(':')
+        name = name_part.split(';', 1)[0].upper()
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {}
+        elif name == 'END' and value.upper() == 'VEVENT' and event is not None:
+            number += 1
+            yield from _ical_event_lessons(event, f"событие {number}")
+            event = None
+        elif event is not None and name not in event:
+            event[name] = value
+
+
+def _ical_event_lessons(event: Dict[str, str], position: str) -> Iterator[Tuple[str, Dict]]:
+    lesson = {
+        'subject': _ical_unescape(event.get('SUMMARY', '')),
+        'subgroup': event.get('X-SUBGROUP', 'all'),
+    }
+    try:
+        start = datetime.strptime(event.get('DTSTART', '')[:15], '%Y%m%dT%H%M%S')
+    except ValueError:
+        yield position, dict(lesson, time=event.get('DTSTART', ''))
+        return
+    lesson['time'] = f"{start.hour}:{start.minute:02d}"
+    try:
+        end = datetime.strptime(event.get('DTEND', '')[:15], '%Y%m%dT%H%M%S')
+    except ValueError:
+        end = None
+    duration = re.fullmatch(r'PT(?:(\d+)H)?(?:(\d+)M)?', event.get('DURATION', '').strip())
+    if end is not None and end.date() == start.date():
+        lesson['end'] = f"{end.hour}:{end.minute:02d}"
+    elif duration and any(duration.groups()):
+        minutes = int(duration.group(1) or 0) * 60 + int(duration.group(2) or 0)
+        # Стандартную пару экспорт пишет как DURATION - конец не указываем
+        if minutes != DEFAULT_LESSON_MINUTES:
+            lesson['duration'] = minutes
+
+    rule = dict(part.split('=', 1) for part in event.get('RRULE', '').split(';') if '=' in part)
+    by_day = [re.sub(r'^[+-]?\d+', '', code) for code in rule.get('BYDAY', '').split(',') if code]
+    weekdays = [ICAL_DAYS.index(code) for code in by_day if code in ICAL_DAYS]
+    for weekday in weekdays or [start.weekday()]:
+        yield position, dict(lesson, day=DAY_NAMES[weekday])
+
+
+# ===== ЭКСПОРТ =====
+def export_lessons(lessons: Iterable[Dict], fmt: str) -> Iterator[str]:
+    """Расписание в формате fmt кусками текста (для записи в файл по мере готовности)"""
+    exporters = {'csv': export_csv, 'json': export_json, 'ics': export_ical}
+    if fmt not in exporters:
+        raise ImportFormatError(f"неизвестный формат '{fmt}'")
+    return exporters[fmt](lessons)
+
+
+def export_to_file(lessons: Iterable[Dict], fmt: str) -> IO[bytes]:
+    """Записать выгрузку во временный файл, готовый к отправке с начала"""
+    file = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    for chunk in export_lessons(lessons, fmt):
+        file.write(chunk.encode('utf-8'))
+    file.seek(0)
+    return file
+
+
+def export_csv(lessons: Iterable[Dict]) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_FIELDS)
+    for lesson in lessons:
+        writer.writerow([lesson.get(field, 'all' if field == 'subgroup' else '') for field in CSV_FIELDS])
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue()
+
+
+def export_json(lessons: Iterable[Dict]) -> Iterator[str]:
+    yield '['
+    for number, lesson in enumerate(lessons):
+        item = {field: lesson.get(field, 'all' if field == 'subgroup' else '') for field in CSV_FIELDS}
+        yield ('\n' if not number else ',\n') + json.dumps(item, ensure_ascii=False)
+    yield '\n]\n'
+
+
+def _ical_escape(value: str) -> str:
+    return (value.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def _ical_fold(line: str) -> str:
+    """Перенос строк длиннее 75 байт, не разрывая символы UTF-8"""
+    parts, current, size = [], '', 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > 75:
+            parts.append(current)
+            current, size = ' ', 1
+        current += char
+        size += char_size
+    parts.append(current)
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def export_ical(lessons: Iterable[Dict], now: Optional[datetime] = None) -> Iterator[str]:
+    """Еженедельно повторяющиеся события, начиная с текущей недели"""
+    now = now or datetime.now()
+    monday = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    yield ''.join(_ical_fold(line) for line in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//study-schedule-bot//RU', 'CALSCALE:GREGORIAN'
+    ))
+    for lesson in map(Lesson.from_dict, lessons):
+        if lesson.weekday is None or lesson.start is None:
+            continue
+        start = monday + timedelta(days=lesson.weekday, minutes=lesson.start)
+        if lesson.end:
+            end = monday + timedelta(days=lesson.weekday, minutes=lesson.finish)
+            ending = f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}"
+        else:
+            ending = f"DURATION:{ICAL_DURATION}"
+        yield ''.join(_ical_fold(line) for line in (
+            'BEGIN:VEVENT',
+            f"UID:lesson-{lesson.id}@study-schedule-bot",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}",
+            ending,
+            f"RRULE:FREQ=WEEKLY;BYDAY={ICAL_DAYS[lesson.weekday]}",
+            f"SUMMARY:{_ical_escape(str(lesson.get('subject', '')))}",
+            f"X-SUBGROUP:{lesson.get('subgroup', 'all')}",
+            'END:VEVENT',
+        ))
+    yield _ical_fold('END:VCALENDAR')
@@ -1,74 +1,103 @@
-from telegram import ReplyKeyboardMarkup
+import functools
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+from messages import DAYS_FULL, DAY_SLUGS
+
+# === ПОДПИСИ КНОПОК ===
+# По этим же строкам бот маршрутизирует нажатия (см. TEXT_ROUTES в bot.py)
+BUTTON_TODAY = "📅 Сегодня"
+BUTTON_TOMORROW = "📅 Завтра"
+BUTTON_WEEK = "📋 Вся неделя"
+BUTTON_ADD = "➕ Добавить урок"
+BUTTON_DELETE = "🗑️ Удалить урок"
+BUTTON_STATS = "📊 Статистика"
+BUTTON_HELP = "❓ Помощь"
+BUTTON_HOME = "🏠 Главное меню"
+BUTTON_FOR_ALL = "👥 Для всех"
+SUBGROUP_BUTTONS = {'1': "🎯 Подгруппа 1", '2': "🎯 Подгруппа 2", 'all': "🎯 Подгруппа all"}
+
+DAY_SHORT = dict(zip(DAYS_FULL, ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]))
+
+# Данные inline-кнопок: "<префикс>:<значение>"
+CALLBACK_DAY = "day"
+CALLBACK_WEEK = "week"
+CALLBACK_SUBGROUP = "subgroup"
+CALLBACK_DELETE = "delete"
+CALLBACK_DELETE_CANCEL = "delete_cancel"
+
+# Клавиатуры Telegram неизменяемы после создания, поэтому каждую
+# собираем один раз (на подгруппу или день) и дальше отдаём тот же объект
 
-# === КОНСТАНТЫ ===
-DAYS_FULL = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
 
 # === ГЛАВНОЕ МЕНЮ (оставляем только обычную клавиатуру) ===
+@functools.lru_cache(maxsize=None)
 def create_main_menu(subgroup: str = '1') -> ReplyKeyboardMarkup:
     """Главное меню бота - ОБЫЧНАЯ КЛАВИАТУРА"""
     menu = [
-        ["📅 Сегодня", "📅 Завтра"],
-        ["📋 Вся неделя", "➕ Добавить урок"],
-        ["🗑️ Удалить урок", "📊 Статистика"],
-        [f"🎯 Подгруппа {subgroup}", "❓ Помощь"]
+        [BUTTON_TODAY, BUTTON_TOMORROW],
+        [BUTTON_WEEK, BUTTON_ADD],
+        [BUTTON_DELETE, BUTTON_STATS],
+        [SUBGROUP_BUTTONS.get(subgroup, f"🎯 Подгруппа {subgroup}"), BUTTON_HELP]
     ]
     return ReplyKeyboardMarkup(menu, resize_keyboard=True, one_time_keyboard=False)
 
 
-# === ТЕКСТОВЫЕ КОМАНДЫ (вместо inline-кнопок) ===
-def get_days_list(subgroup: str = '1') -> str:
-    """Возвращает текстовый список дней"""
-    days_text = "📅 Доступные дни:\n\n"
-    for day in DAYS_FULL:
-        days_text += f"/day_{day.lower()} - {day} (подгруппа {subgroup})\n"
-    days_text += f"\n/week - Вся неделя (подгруппа {subgroup})"
-    return days_text
-
-
-def get_subgroups_list() -> str:
-    """Возвращает текстовый список подгрупп"""
-    return (
-        "🎯 Доступные подгруппы:\n\n"
-        "/subgroup_1 - Подгруппа 1\n"
-        "/subgroup_2 - Подгруппа 2\n"
-        "/subgroup_all - Для всех подгрупп"
-    )
-
-
-def get_confirmation_text(lesson_id: int) -> str:
-    """Текст для подтверждения удаления"""
-    return (
-        f"🗑️ Удалить урок #{lesson_id}?\n\n"
-        "Напишите:\n"
-        f"✅ /confirm_delete_{lesson_id} - чтобы удалить\n"
-        "❌ /cancel - чтобы отменить"
-    )
-
-
-# === ТЕКСТОВЫЕ КОМАНДЫ ДЛЯ ДНЕЙ ===
-def get_day_commands() -> list:
-    """Возвращает список команд для дней"""
-    commands = []
-    for day in DAYS_FULL:
-        commands.append(f"/day_{day.lower()}")
-    return commands
-
-
 # === УПРОЩЕННЫЕ КЛАВИАТУРЫ (если всё же понадобятся) ===
+@functools.lru_cache(maxsize=None)
 def create_simple_days_keyboard() -> ReplyKeyboardMarkup:
     """Простая клавиатура с днями"""
     keyboard = []
     for i in range(0, len(DAYS_FULL), 3):
         row = DAYS_FULL[i:i + 3]
         keyboard.append(row)
-    keyboard.append(["📋 Вся неделя", "🏠 Главное меню"])
+    keyboard.append([BUTTON_WEEK, BUTTON_HOME])
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
+@functools.lru_cache(maxsize=None)
 def create_simple_subgroups_keyboard() -> ReplyKeyboardMarkup:
     """Простая клавиатура с подгруппами"""
     keyboard = [
-        ["🎯 Подгруппа 1", "🎯 Подгруппа 2"],
-        ["👥 Для всех", "🏠 Главное меню"]
+        [SUBGROUP_BUTTONS['1'], SUBGROUP_BUTTONS['2']],
+        [BUTTON_FOR_ALL, BUTTON_HOME]
+    ]
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+
+# === INLINE-КЛАВИАТУРЫ (выбор редактирует то же сообщение) ===
+@functools.lru_cache(maxsize=None)
+def create_days_inline_keyboard(selected_day: str = None) -> InlineKeyboardMarkup:
+    """Inline-выбор дня недели; выбранный день отмечен точкой"""
+    buttons = [
+        InlineKeyboardButton(
+            f"• {DAY_SHORT[day]}" if day == selected_day else DAY_SHORT[day],
+            callback_data=f"{CALLBACK_DAY}:{DAY_SLUGS[day]}"
+        )
+        for day in DAYS_FULL
+    ]
+    keyboard = [buttons[:4], buttons[4:]]
+    keyboard.append([InlineKeyboardButton(BUTTON_WEEK, callback_data=f"{CALLBACK_WEEK}:")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+# Не кэшируем: клавиатура своя у каждого урока и нужна один раз
+def create_delete_confirmation_keyboard(lesson_id: int) -> InlineKeyboardMarkup:
+    """Кнопки подтверждения удаления урока"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("✅ Удалить", callback_data=f"{CALLBACK_DELETE}:{lesson_id}"),
+        InlineKeyboardButton("❌ Отмена", callback_data=f"{CALLBACK_DELETE_CANCEL}:{lesson_id}"),
+    ]])
+
+
+@functools.lru_cache(maxsize=None)
+def create_subgroups_inline_keyboard(current: str = None) -> InlineKeyboardMarkup:
+    """Inline-выбор подгруппы; текущая отмечена галочкой"""
+    labels = {'1': "Подгруппа 1", '2': "Подгруппа 2", 'all': "Для всех"}
+    row = [
+        InlineKeyboardButton(
+            f"✅ {label}" if subgroup == current else label,
+            callback_data=f"{CALLBACK_SUBGROUP}:{subgroup}"
+        )
+        for subgroup, label in labels.items()
     ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
\ No newline at end of file
+    return InlineKeyboardMarkup([row])
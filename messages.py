@@ -1,6 +1,14 @@
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from models import Lesson, Subgroup
+
 # === КОНСТАНТЫ ===
 DAYS_FULL = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
 
+# Команды Telegram пишутся латиницей: /day_monday и т.д.
+DAY_SLUGS = dict(zip(DAYS_FULL, ["monday", "tuesday", "wednesday", "thursday",
+                                 "friday", "saturday", "sunday"]))
+
 DAY_EMOJIS = {
     'Понедельник': '📅', 'Вторник': '📅', 'Среда': '📅', 'Четверг': '📅',
     'Пятница': '📅', 'Суббота': '🎉', 'Воскресенье': '🌟'
@@ -11,37 +19,104 @@ DAY_NUMBER_EMOJIS = {
     'Пятница': '5️⃣', 'Суббота': '6️⃣', 'Воскресенье': '7️⃣'
 }
 
+# Ограничение Telegram на длину одного сообщения
+MAX_MESSAGE_LENGTH = 4096
+ALL_LESSONS_PAGE_SIZE = 40
+FIND_RESULTS_LIMIT = 30
+CONFLICTS_LIMIT = 50
+# Telegram не отправляет пустой текст - вместо него уходит это сообщение
+EMPTY_MESSAGE_TEXT = "📭 Нет данных"
+
 SUBGROUP_TEXTS = {
-    '1': "🎯 (подгруппа 1)",
-    '2': "🎯 (подгруппа 2)",
-    'all': "👥 (для всех подгрупп)"
+    Subgroup.FIRST: "🎯 (подгруппа 1)",
+    Subgroup.SECOND: "🎯 (подгруппа 2)",
+    Subgroup.ALL: "👥 (для всех подгрупп)"
 }
 
 
+# === КЭШ ГОТОВЫХ СООБЩЕНИЙ ===
+class RenderCache:
+    """Кэш готовых текстов по ключу (вид, день, подгруппа, доп. ключ) для версии расписания.
+
+    С приходом более новой версии расписания кэш сбрасывается целиком;
+    запросы со старой версией (обработчик, начатый до изменения) кэш не
+    трогают. Дополнительно запись помнит списки уроков, из которых построен
+    текст: если кэш данных отдал новые списки, текст перестраивается.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._version: Optional[int] = None
+        self._entries: Dict[Tuple, Tuple[Tuple, str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _use_version(self, version: int) -> bool:
+        """Перейти на более новую версию; False - версия устарела"""
+        if self._version is None or version > self._version:
+            self._entries.clear()
+            self._version = version
+        return version == self._version
+
+    def get(self, view: str, day: Optional[str], subgroup: Optional[str],
+            version: int, sources: Tuple = (), key: Hashable = None) -> Optional[str]:
+        entry = self._entries.get((view, day, subgroup, key)) if self._use_version(version) else None
+        if (entry is None or len(entry[0]) != len(sources)
+                or any(a is not b for a, b in zip(entry[0], sources))):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, view: str, day: Optional[str], subgroup: Optional[str],
+            version: int, sources: Tuple, text: str, key: Hashable = None) -> None:
+        if not self._use_version(version):
+            return
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+        self._entries[(view, day, subgroup, key)] = (sources, text)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+render_cache = RenderCache()
+
+
+def cached_render(view: str, day: Optional[str], subgroup: Optional[str], version: int,
+                  sources: Tuple, render: Callable[..., str], *args: Any) -> str:
+    """Вернуть текст из кэша или построить его через render(*args)"""
+    text = render_cache.get(view, day, subgroup, version, sources)
+    if text is None:
+        text = render(*args)
+        render_cache.put(view, day, subgroup, version, sources, text)
+    return text
+
+
 # === ФОРМАТИРОВАНИЕ УРОКОВ ===
-def format_lesson_short(lesson: dict) -> str:
-    """Краткая информация об уроке"""
-    time_str = lesson.get('time', '--:--')
-    subject_str = lesson.get('subject', 'Без названия')
-    subgroup = lesson.get('subgroup', 'all')
-
-    if subgroup == '1':
-        return f"• {time_str} - {subject_str} [1]"
-    elif subgroup == '2':
-        return f"• {time_str} - {subject_str} [2]"
+def _lesson_label(lesson: Lesson) -> str:
+    """Время, предмет и метка подгруппы"""
+    time_str = lesson.time_text
+    subject_str = lesson.subject or 'Без названия'
+
+    if lesson.subgroup is Subgroup.FIRST:
+        return f"{time_str} - {subject_str} [1]"
+    elif lesson.subgroup is Subgroup.SECOND:
+        return f"{time_str} - {subject_str} [2]"
     else:
-        return f"• {time_str} - {subject_str}"
+        return f"{time_str} - {subject_str}"
+
+
+def format_lesson_short(lesson: Lesson) -> str:
+    """Краткая информация об уроке"""
+    return f"• {_lesson_label(lesson)}"
 
 
 def _format_lessons_by_subgroup(lessons: list) -> dict:
     """Группировать уроки по подгруппам"""
-    grouped = {'1': [], '2': [], 'all': []}
+    grouped = {Subgroup.FIRST: [], Subgroup.SECOND: [], Subgroup.ALL: []}
     for lesson in lessons:
-        subgroup = lesson.get('subgroup', 'all')
-        if subgroup in grouped:
-            grouped[subgroup].append(lesson)
-        else:
-            grouped['all'].append(lesson)
+        grouped.get(lesson.subgroup, grouped[Subgroup.ALL]).append(lesson)
     return grouped
 
 
@@ -54,42 +129,27 @@ def format_day_schedule(day: str, lessons: list) -> str:
     emoji = DAY_EMOJIS.get(day, '📅')
     grouped = _format_lessons_by_subgroup(lessons)
 
-    message = f"{emoji} {day}\n\n"
-    total_lessons = 0
-
-    # Уроки для всех подгрупп
-    if grouped['all']:
-        message += "👥 Для всех подгрупп:\n"
-        for i, lesson in enumerate(grouped['all'], 1):
-            subject = lesson.get('subject', 'Без названия')
-            time = lesson.get('time', '--:--')
-            message += f"  {i}. {time} - {subject}\n"
-        total_lessons += len(grouped['all'])
-        if grouped['1'] or grouped['2']:
-            message += "\n"
-
-    # Уроки для подгруппы 1
-    if grouped['1']:
-        message += "🎯 Подгруппа 1:\n"
-        for i, lesson in enumerate(grouped['1'], 1):
-            subject = lesson.get('subject', 'Без названия')
-            time = lesson.get('time', '--:--')
-            message += f"  {i}. {time} - {subject}\n"
-        total_lessons += len(grouped['1'])
-        if grouped['2']:
-            message += "\n"
-
-    # Уроки для подгруппы 2
-    if grouped['2']:
-        message += "🎯 Подгруппа 2:\n"
-        for i, lesson in enumerate(grouped['2'], 1):
-            subject = lesson.get('subject', 'Без названия')
-            time = lesson.get('time', '--:--')
-            message += f"  {i}. {time} - {subject}\n"
-        total_lessons += len(grouped['2'])
-
-    message += f"\n📊 Всего уроков: {total_lessons}"
-    return message
+    parts = [f"{emoji} {day}\n\n"]
+    sections = [
+        ("👥 Для всех подгрупп:", grouped[Subgroup.ALL]),
+        ("🎯 Подгруппа 1:", grouped[Subgroup.FIRST]),
+        ("🎯 Подгруппа 2:", grouped[Subgroup.SECOND]),
+    ]
+    blocks = []
+    for title, group in sections:
+        if not group:
+            continue
+        block = [f"{title}\n"]
+        for i, lesson in enumerate(group, 1):
+            subject = lesson.subject or 'Без названия'
+            time = lesson.time_text
+            block.append(f"  {i}. {time} - {subject}\n")
+        blocks.append(''.join(block))
+
+    # Между группами - пустая строка
+    parts.append('\n'.join(blocks))
+    parts.append(f"\n📊 Всего уроков: {len(lessons)}")
+    return ''.join(parts)
 
 
 def format_full_schedule_by_days(days_data: dict) -> str:
@@ -97,7 +157,7 @@ def format_full_schedule_by_days(days_data: dict) -> str:
     if not days_data or not any(lessons for lessons in days_data.values()):
         return "📋 Ваше расписание\n\n📭 Расписание пустое!\n\nИспользуйте /add чтобы добавить уроки."
 
-    message = "📋 Ваше расписание на неделю\n"
+    parts = ["📋 Ваше расписание на неделю\n"]
     total_lessons = 0
 
     for day in DAYS_FULL:
@@ -106,12 +166,11 @@ def format_full_schedule_by_days(days_data: dict) -> str:
             total_lessons += len(lessons)
             emoji = DAY_NUMBER_EMOJIS.get(day, '📅')
 
-            message += f"\n{emoji} {day}:\n"
-            for lesson in lessons:
-                message += f"   {format_lesson_short(lesson)}\n"
+            parts.append(f"\n{emoji} {day}:\n")
+            parts.extend(f"   {format_lesson_short(lesson)}\n" for lesson in lessons)
 
-    message += f"\n📊 Итого: {total_lessons} уроков"
-    return message
+    parts.append(f"\n📊 Итого: {total_lessons} уроков")
+    return ''.join(parts)
 
 
 def format_week_overview(days_with_lessons: list) -> str:
@@ -121,13 +180,10 @@ def format_week_overview(days_with_lessons: list) -> str:
 
     sorted_days = [day for day in DAYS_FULL if day in days_with_lessons]
 
-    message = "📊 Обзор недели:\n"
-    for day in sorted_days:
-        emoji = DAY_NUMBER_EMOJIS.get(day, '📅')
-        message += f"{emoji} {day}\n"
-
-    message += f"\n📈 Всего дней с уроками: {len(sorted_days)}"
-    return message
+    parts = ["📊 Обзор недели:\n"]
+    parts.extend(f"{DAY_NUMBER_EMOJIS.get(day, '📅')} {day}\n" for day in sorted_days)
+    parts.append(f"\n📈 Всего дней с уроками: {len(sorted_days)}")
+    return ''.join(parts)
 
 
 # === СООБЩЕНИЯ ДЛЯ КОМАНД ===
@@ -137,66 +193,157 @@ def format_day_command_response(day: str, lessons: list, subgroup: str) -> str:
         return f"📅 {day}\n\n🎉 Нет уроков для подгруппы {subgroup}!"
 
     subgroup_text = SUBGROUP_TEXTS.get(subgroup, f"подгруппа {subgroup}")
-    message = f"📅 {day} {subgroup_text}\n\n"
+    parts = [f"📅 {day} {subgroup_text}\n\n"]
 
     for i, lesson in enumerate(lessons, 1):
-        subject = lesson.get('subject', 'Без названия')
-        time = lesson.get('time', '--:--')
-        message += f"{i}. {time} - {subject}\n"
+        subject = lesson.subject or 'Без названия'
+        time = lesson.time_text
+        parts.append(f"{i}. {time} - {subject}\n")
 
-    message += f"\n📊 Всего уроков: {len(lessons)}"
-    return message
+    parts.append(f"\n📊 Всего уроков: {len(lessons)}")
+    return ''.join(parts)
 
 
-def format_all_lessons_message(all_lessons: list) -> str:
-    """Сообщение со всеми уроками"""
-    if not all_lessons:
-        return "📭 В базе данных нет уроков"
-
-    # Группируем по дням
-    lessons_by_day = {}
-    for lesson in all_lessons:
-        day = lesson.get('day', 'Неизвестно')
-        if day not in lessons_by_day:
-            lessons_by_day[day] = []
-        lessons_by_day[day].append(lesson)
+def format_today_response(day: str, lessons: list, subgroup: str, tomorrow: bool = False) -> str:
+    """Короткий ответ для /today и /tomorrow"""
+    if not lessons:
+        when = "Завтра" if tomorrow else "Сегодня"
+        return f"🎉 {day}\n{when} нет уроков для подгруппы {subgroup}!"
+
+    parts = [f"📅 {day} (подгруппа {subgroup}):\n\n"]
+    parts.extend(f"• {lesson.time_text} - {lesson.subject}\n" for lesson in lessons)
+    return ''.join(parts)
+
+
+def format_reminder_message(lessons: list, lead_minutes: int) -> str:
+    """Напоминание о ближайших занятиях"""
+    parts = [f"🔔 Через {lead_minutes} мин:\n\n"]
+    parts.extend(f"{format_lesson_short(lesson)}\n" for lesson in lessons)
+    return ''.join(parts)
+
+
+def format_broadcast_status(stats: dict, finished: bool = False) -> str:
+    """Ход или итог рассылки объявления"""
+    done = stats['sent'] + stats['failed']
+    title = "✅ Рассылка завершена" if finished else "📣 Идёт рассылка..."
+    parts = [
+        f"{title}\n\n",
+        f"• Получателей: {stats['total']}\n",
+        f"• Отправлено: {stats['sent']}\n",
+        f"• Не доставлено: {stats['failed']}\n",
+        f"• Повторов: {stats['retries']}",
+    ]
+    if finished:
+        parts.append(f"\n⏱ Время: {stats.get('elapsed', 0)} с")
+    else:
+        parts.append(f"\n📈 Готово: {done}/{stats['total']}")
+    return ''.join(parts)
 
-    # Сортируем дни по порядку
-    sorted_days = []
-    for day in DAYS_FULL:
-        if day in lessons_by_day:
-            sorted_days.append(day)
-    for day in lessons_by_day:
-        if day not in sorted_days:
-            sorted_days.append(day)
-
-    # Формируем сообщение
-    result = "📚 Все уроки в базе данных:\n\n"
-    total_lessons = 0
 
-    for day in sorted_days:
-        lessons = lessons_by_day[day]
-        total_lessons += len(lessons)
+def _group_lessons_by_day(lessons: list) -> list:
+    """Пары (день, уроки) в порядке недели; неизвестные дни - в конце"""
+    known = {}
+    unknown = {}
+    for lesson in lessons:
+        if lesson.weekday is not None:
+            known.setdefault(lesson.weekday, []).append(lesson)
+        else:
+            unknown.setdefault(lesson.day or 'Неизвестно', []).append(lesson)
 
-        result += f"\n📅 {day.upper()}\n"
+    days = [(DAYS_FULL[weekday], known[weekday]) for weekday in sorted(known)]
+    days.extend(unknown.items())
+    return days
 
-        # Сортируем уроки по времени
-        lessons.sort(key=lambda x: x.get('time', '00:00'))
 
+def _format_all_lessons_days(days: list) -> list:
+    parts = []
+    for day, lessons in days:
+        parts.append(f"\n📅 {day.upper()}\n")
         for lesson in lessons:
-            time = lesson.get('time', '??:??')
-            subject = lesson.get('subject', 'Неизвестно')
-            subgroup = lesson.get('subgroup', 'all')
-
-            if subgroup == '1':
-                result += f"🕒 {time} - {subject} [1]\n"
-            elif subgroup == '2':
-                result += f"🕒 {time} - {subject} [2]\n"
+            time = lesson.time_text
+            subject = lesson.subject or 'Неизвестно'
+
+            if lesson.subgroup is Subgroup.FIRST:
+                parts.append(f"🕒 {time} - {subject} [1]\n")
+            elif lesson.subgroup is Subgroup.SECOND:
+                parts.append(f"🕒 {time} - {subject} [2]\n")
             else:
-                result += f"🕒 {time} - {subject}\n"
+                parts.append(f"🕒 {time} - {subject}\n")
+    return parts
+
+
+def page_count(total: int, page_size: int = ALL_LESSONS_PAGE_SIZE) -> int:
+    """Число страниц (минимум одна, даже для пустого списка)"""
+    return max(1, -(-total // page_size))
 
-    result += f"\n📊 Всего уроков в базе: {total_lessons}"
-    return result
+
+def format_all_lessons_page(page_lessons: list, page: int, pages: int, total: int) -> str:
+    """Одна страница /all: уроки уже отсортированы по дню и времени"""
+    if not total:
+        return "📭 В базе данных нет уроков"
+
+    title = "📚 Все уроки в базе данных"
+    if pages > 1:
+        title += f" (стр. {page}/{pages})"
+    parts = [f"{title}:\n\n"]
+    parts.extend(_format_all_lessons_days(_group_lessons_by_day(page_lessons)))
+    parts.append(f"\n📊 Всего уроков в базе: {total}")
+
+    if pages > 1:
+        nav = [f"📄 Страница {page} из {pages}"]
+        if page > 1:
+            nav.append(f"◀️ /all {page - 1}")
+        if page < pages:
+            nav.append(f"▶️ /all {page + 1}")
+        parts.append("\n" + " • ".join(nav))
+    return ''.join(parts)
+
+
+# === РАЗБИЕНИЕ ДЛИННЫХ СООБЩЕНИЙ ===
+def _split_hard(text: str, limit: int) -> list:
+    """Разбить кусок без пустых строк: по строкам, а слишком длинные строки - как есть"""
+    chunks, current = [], ''
+    for line in text.split('\n'):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            candidate = line
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list:
+    """Разбить текст на части не длиннее limit символов.
+
+    Дни в расписании отделены пустой строкой, поэтому режем по пустым
+    строкам и собираем части жадно; день длиннее лимита режется по строкам.
+    Всегда возвращает хотя бы одну непустую часть.
+    """
+    if not text.strip():
+        return [EMPTY_MESSAGE_TEXT]
+    if len(text) <= limit:
+        return [text]
+
+    chunks, current = [], ''
+    for block in text.split('\n\n'):
+        pieces = _split_hard(block, limit) if len(block) > limit else [block]
+        for piece in pieces:
+            candidate = f"{current}\n\n{piece}" if current else piece
+            if len(candidate) > limit:
+                chunks.append(current)
+                candidate = piece
+            current = candidate
+    if current:
+        chunks.append(current)
+    return [chunk.strip('\n') for chunk in chunks if chunk.strip()]
 
 
 # === ТЕКСТОВЫЕ СООБЩЕНИЯ ===
@@ -224,7 +371,9 @@ def get_help_message() -> str:
         "/today - Расписание на сегодня\n"
         "/tomorrow - Расписание на завтра\n"
         "/week - Вся неделя\n"
-        "/all - Все уроки в базе\n"
+        "/all [страница] - Все уроки в базе\n"
+        "/find <предмет> - Найти уроки по названию (можно начало слова)\n"
+        "/conflicts [1|2|all] - Уроки, которые пересекаются по времени\n"
         "/schedule - Показать список дней\n"
         "/subgroup - Показать список подгрупп\n"
         "/help - Эта справка\n\n"
@@ -233,15 +382,24 @@ def get_help_message() -> str:
         "/add Математика 10:00 Понедельник\n"
         "/add Математика 10:00 Понедельник 1\n"
         "/add Математика 10:00 Понедельник 2\n"
-        "/add Математика 10:00 Понедельник all\n\n"
+        "/add Математика 10:00 Понедельник all\n"
+        "/add Физика 8:00-9:30 пн 1 - с временем окончания\n"
+        "/add Химия 11:00+60 вт - с длительностью в минутах\n\n"
+
+        "✏️ ИЗМЕНЕНИЕ УРОКА:\n"
+        "/update 1 Математика 10:00-11:30 Понедельник - Заменить урок с ID=1\n\n"
 
         "🗑️ УДАЛЕНИЕ УРОКА:\n"
         "/delete 1 - Удалить урок с ID=1\n"
-        "После /delete используйте:\n"
-        "/confirm_delete_1 - чтобы подтвердить\n"
-        "/cancel - чтобы отменить\n\n"
+        "Затем подтвердите кнопкой ✅ или отмените кнопкой ❌\n\n"
+
+        "📦 ИМПОРТ И ЭКСПОРТ:\n"
+        "/import - Загрузить уроки из файла CSV, JSON или iCal\n"
+        "/export [csv|json|ics] - Выгрузить расписание файлом\n\n"
 
         "⚙️ ДОПОЛНИТЕЛЬНО:\n"
+        "/reminders - Включить/выключить напоминания\n"
+        "/announce <текст> - Объявление всем (для админов)\n"
         "/clearcache - Очистить кэш\n\n"
 
         "💡 СОВЕТЫ:\n"
@@ -251,12 +409,16 @@ def get_help_message() -> str:
     )
 
 
+def day_command(day: str) -> str:
+    """Имя команды дня без слэша: 'Понедельник' -> 'day_monday'"""
+    return f"day_{DAY_SLUGS[day]}"
+
+
 def get_days_list_message(subgroup: str = '1') -> str:
     """Сообщение со списком дней"""
     message = "📅 Доступные команды для дней:\n\n"
     for day in DAYS_FULL:
-        day_lower = day.lower()
-        message += f"• /day_{day_lower} - {day}\n"
+        message += f"• /{day_command(day)} - {day}\n"
     message += f"\n✨ Пример: /day_monday\n"
     message += f"🎯 Текущая подгруппа: {subgroup}"
     return message
@@ -282,18 +444,22 @@ def get_add_instruction_message() -> str:
         "• /add Математика 10:00 Понедельник - для всех\n"
         "• /add Математика 10:00 Понедельник 1 - для подгруппы 1\n"
         "• /add Математика 10:00 Понедельник 2 - для подгруппы 2\n"
-        "• /add Математика 10:00 Понедельник all - для всех подгрупп\n\n"
+        "• /add Математика 10:00 Понедельник all - для всех подгрупп\n"
+        "• /add Физика 8:00-9:30 пн 2 - с временем окончания\n\n"
+        "🕒 Время: 8:00, 08.00 или 8-00; диапазон: 8:00-9:30; длительность: 8:00+90\n"
+        "⏱ Без времени окончания урок длится 90 минут\n"
+        "📅 День: полностью или сокращённо (пн, вт, Mon, Tue)\n"
         "⚠️ Подгруппа по умолчанию: all"
     )
 
 
-def format_delete_confirmation_message(lesson: dict) -> str:
+def format_delete_confirmation_message(lesson: Lesson) -> str:
     """Сообщение подтверждения удаления"""
     subject = lesson.get('subject', 'Неизвестно')
-    time = lesson.get('time', 'Неизвестно')
+    time = lesson.time_text
     day = lesson.get('day', 'Неизвестно')
-    subgroup = lesson.get('subgroup', 'all')
-    lesson_id = str(lesson.get('id', 'Неизвестно'))
+    subgroup = lesson.subgroup
+    lesson_id = str(lesson.id)
 
     subgroup_text = SUBGROUP_TEXTS.get(subgroup, f"подгруппа {subgroup}")
 
@@ -303,8 +469,111 @@ def format_delete_confirmation_message(lesson: dict) -> str:
     message += f"• День: {day}\n"
     message += f"• Подгруппа: {subgroup_text}\n"
     message += f"• ID: {lesson_id}\n\n"
-    message += f"📝 Для подтверждения напишите:\n"
-    message += f"/confirm_delete_{lesson_id} - удалить\n"
-    message += "/cancel - отменить"
+    message += "👇 Подтвердите удаление кнопкой ниже"
 
-    return message
\ No newline at end of file
+    return message
+
+
+def format_lesson_deleted_message(lesson: Lesson) -> str:
+    """Итог удаления урока"""
+    return (
+        f"✅ Урок #{lesson.id} удален: "
+        f"{lesson.get('subject', 'Без названия')} ({lesson.get('day', '?')}, {lesson.time_text})"
+    )
+
+def get_import_instruction_message(max_size_mb: int) -> str:
+    """Инструкция по импорту уроков из файла"""
+    return (
+        "📦 Отправьте файл с уроками следующим сообщением (или с подписью /import)\n\n"
+        "📌 Форматы:\n"
+        "• CSV (.csv): столбцы subject, time, day, subgroup "
+        "(или предмет, время, день, подгруппа)\n"
+        "• JSON (.json): массив объектов с теми же полями\n"
+        "• iCal (.ics): события календаря, день и время берутся из начала события\n\n"
+        f"⚠️ Размер файла - до {max_size_mb} МБ, подгруппа по умолчанию: all\n"
+        "❌ Отменить: /cancel"
+    )
+
+
+def format_import_result(added: int, errors: list, error_count: int, conflicts: int = 0) -> str:
+    """Итог импорта: сколько добавлено и какие строки отклонены"""
+    message = f"✅ Импортировано уроков: {added}"
+    if conflicts:
+        message += f"\n⚠️ Пересекаются по времени с другими уроками: {conflicts} (см. /conflicts)"
+    if error_count:
+        message += f"\n⚠️ Пропущено записей с ошибками: {error_count}\n\n"
+        message += "\n".join(f"• {error}" for error in errors)
+        if error_count > len(errors):
+            message += f"\n• ... и еще {error_count - len(errors)}"
+    return message
+
+
+def get_update_instruction_message() -> str:
+    """Инструкция по изменению урока"""
+    return (
+        "✏️ Формат: /update <ID> <предмет> <время> <день> [подгруппа]\n\n"
+        "📌 Пример:\n"
+        "• /update 5 Математика 10:00-11:30 Понедельник 1\n\n"
+        "ℹ️ Урок заменяется целиком; ID можно узнать в /all или /find"
+    )
+
+
+def format_conflict_warning(lessons: list) -> str:
+    """Предупреждение после /add и /update: с чем урок пересекается по времени"""
+    if not lessons:
+        return ""
+    parts = ["\n\n⚠️ Пересекается по времени:\n"]
+    parts.extend(f"{format_lesson_short(lesson)} (ID: {lesson.id})\n" for lesson in lessons)
+    parts.append("Все пересечения: /conflicts")
+    return ''.join(parts)
+
+
+def format_conflicts_report(pairs: list, subgroup: str, limit: int = CONFLICTS_LIMIT) -> str:
+    """Отчёт /conflicts: пары пересекающихся уроков по дням"""
+    subgroup_text = SUBGROUP_TEXTS.get(subgroup, f"подгруппа {subgroup}")
+    if not pairs:
+        return f"✅ Пересечений по времени нет {subgroup_text}"
+
+    parts = [f"⚠️ Пересечения по времени {subgroup_text}: {len(pairs)}\n"]
+    day = None
+    for first, second in pairs[:limit]:
+        if first.day != day:
+            day = first.day
+            parts.append(f"\n📅 {day}\n")
+        parts.append(f"{format_lesson_short(first)} (ID: {first.id})\n")
+        parts.append(f"  ↔ {_lesson_label(second)} (ID: {second.id})\n")
+    if len(pairs) > limit:
+        parts.append(f"\n... и еще {len(pairs) - limit}")
+    return ''.join(parts)
+
+
+def format_search_results(query: str, lessons: list, limit: int = FIND_RESULTS_LIMIT) -> str:
+    """Результаты /find: лучшие совпадения первыми"""
+    if not lessons:
+        return f"🔍 По запросу «{query}» ничего не найдено"
+
+    message = f"🔍 Найдено по запросу «{query}»: {len(lessons)}\n\n"
+    for lesson in lessons[:limit]:
+        message += f"{format_lesson_short(lesson)} ({lesson.day or '?'}, ID: {lesson.id})\n"
+    if len(lessons) > limit:
+        message += f"\n... и еще {len(lessons) - limit}, уточните запрос"
+    return message.rstrip()
+
+
+def format_stats_message(stats: dict) -> str:
+    """Статистика расписания подгруппы"""
+    message = f"📊 Статистика для подгруппы {stats['subgroup']}:\n\n"
+    message += f"• Всего уроков: {stats['total_lessons']}\n"
+    message += f"• Дней с уроками: {stats['days_with_lessons']}\n"
+    message += f"• Разных предметов: {stats['subjects_count']}\n"
+    if stats['total_lessons']:
+        message += f"• Часов занятий в неделю: {stats['contact_hours']:g}\n"
+        message += f"• Окон между парами: {stats['windows']}"
+        if stats['windows']:
+            message += f" (всего {stats['window_minutes'] // 60} ч {stats['window_minutes'] % 60} мин)"
+        message += "\n"
+    if stats['earliest_start']:
+        message += f"• Самое раннее начало: {stats['earliest_start']}\n"
+    if stats['most_busy_day']:
+        message += f"• Самый загруженный день: {stats['most_busy_day']}"
+    return message.rstrip()
@@ -0,0 +1,281 @@
+import re
+import sys
+from collections.abc import Mapping
+from enum import Enum
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+# Дни в каноничном виде - так день записывается в урок
+DAY_NAMES = ('Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье')
+# Русские названия дней -> номер дня недели (0 - понедельник)
+WEEKDAYS = {name.lower(): number for number, name in enumerate(DAY_NAMES)}
+# Сокращения и английские названия, которые понимает /add и импорт
+DAY_ALIASES = {
+    **WEEKDAYS,
+    'пн': 0, 'пон': 0, 'mon': 0, 'monday': 0,
+    'вт': 1, 'втр': 1, 'tue': 1, 'tues': 1, 'tuesday': 1,
+    'ср': 2, 'срд': 2, 'wed': 2, 'wednesday': 2,
+    'чт': 3, 'чтв': 3, 'thu': 3, 'thur': 3, 'thurs': 3, 'thursday': 3,
+    'пт': 4, 'птн': 4, 'fri': 4, 'friday': 4,
+    'сб': 5, 'суб': 5, 'sat': 5, 'saturday': 5,
+    'вс': 6, 'вск': 6, 'sun': 6, 'sunday': 6,
+}
+
+# Время: 8:00, 08.00, 8-00; диапазон: 8:00-9:30, 8.00 – 9.30; длительность: 8:00+90
+TIME_PATTERN = r'(\d{1,2})[:.-](\d{2})'
+TIME_RE = re.compile(TIME_PATTERN)
+TIME_RANGE_RE = re.compile(rf'{TIME_PATTERN}\s*[-–—]\s*{TIME_PATTERN}')
+TIME_DURATION_RE = re.compile(rf'{TIME_PATTERN}\s*\+\s*(\d{{1,4}})')
+# Длительность пары, если у урока не указано время окончания
+DEFAULT_LESSON_MINUTES = 90
+MINUTES_PER_DAY = 24 * 60
+# Так диапазон времени показывается в сообщениях
+TIME_RANGE_DASH = '–'
+
+# Поля урока в порядке, в котором они пишутся в schedule.json
+LESSON_FIELDS = ('subject', 'time', 'end', 'day', 'id', 'created_at', 'subgroup', 'updated_at')
+
+
+class LessonError(ValueError):
+    """Урок с некорректными полями: текст ошибки можно показать пользователю"""
+
+
+class Subgroup(str, Enum):
+    """Подгруппа урока; ведёт себя как обычная строка '1', '2' или 'all'"""
+    FIRST = '1'
+    SECOND = '2'
+    ALL = 'all'
+
+    def __str__(self) -> str:
+        return self.value
+
+    # Хэш как у строки: Subgroup.FIRST находится в словарях по ключу '1'
+    __hash__ = str.__hash__
+
+    @classmethod
+    def parse(cls, value: Any) -> Union['Subgroup', str]:
+        """Подгруппа из сырого значения; незнакомые значения остаются строкой"""
+        text = str(value).strip().lower()
+        try:
+            return cls(text)
+        except ValueError:
+            return sys.intern(text)
+
+
+# ===== РАЗБОР ВРЕМЕНИ И ДНЕЙ =====
+def _to_minutes(hours: str, minutes: str) -> Optional[int]:
+    hours, minutes = int(hours), int(minutes)
+    if hours < 24 and minutes < 60:
+        return hours * 60 + minutes
+    return None
+
+
+def parse_time(value: Any) -> Optional[int]:
+    """Время в минутах от полуночи или None, если время не разобрать"""
+    match = TIME_RE.fullmatch(str(value).strip())
+    return _to_minutes(*match.groups()) if match else None
+
+
+def parse_time_range(value: Any) -> Optional[Tuple[int, Optional[int]]]:
+    """(начало, конец) в минутах; у одиночного времени конец - None"""
+    text = str(value).strip()
+    match = TIME_RANGE_RE.fullmatch(text)
+    if match:
+        start, end = _to_minutes(*match.groups()[:2]), _to_minutes(*match.groups()[2:])
+        if start is None or end is None:
+            return None
+        return start, end
+    match = TIME_DURATION_RE.fullmatch(text)
+    if match:
+        start = _to_minutes(*match.groups()[:2])
+        if start is None or start + int(match.group(3)) >= MINUTES_PER_DAY:
+            return None
+        return start, start + int(match.group(3))
+    start = parse_time(text)
+    return (start, None) if start is not None else None
+
+
+def parse_start(value: Any) -> Optional[int]:
+    """Начало урока в минутах (в том числе из диапазона) или None"""
+    parsed = parse_time_range(value)
+    return parsed[0] if parsed else None
+
+
+def format_time(minutes: int) -> str:
+    """Каноничная запись времени: 8:05, 13:30"""
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def parse_day(value: Any) -> Optional[int]:
+    """Номер дня недели (0 - понедельник) по названию или сокращению"""
+    return DAY_ALIASES.get(str(value).strip().lower().rstrip('.'))
+
+
+def day_key(value: Any) -> str:
+    """Ключ дня для индексов: каноничное название в нижнем регистре"""
+    weekday = parse_day(value)
+    if weekday is not None:
+        return DAY_NAMES[weekday].lower()
+    return str(value).strip().lower()
+
+
+def normalize_lesson(raw: Mapping) -> Dict[str, Any]:
+    """Пользовательские поля урока в каноничном виде; LessonError - если они некорректны"""
+    subject = str(raw.get('subject') or '').strip()
+    if not subject:
+        raise LessonError("не указан предмет")
+
+    time_str = str(raw.get('time') or '').strip()
+    parsed = parse_time_range(time_str)
+    if parsed is None:
+        raise LessonError(f"неверное время '{time_str}' (нужно ЧЧ:ММ, ЧЧ:ММ-ЧЧ:ММ или ЧЧ:ММ+минуты)")
+    start, end = parsed
+    if raw.get('end') and end is None:
+        end_str = str(raw['end']).strip()
+        end = parse_time(end_str)
+        if end is None:
+            raise LessonError(f"неверное время окончания '{end_str}' (нужно ЧЧ:ММ)")
+    elif raw.get('duration') and end is None:
+        duration = str(raw['duration']).strip()
+        if not duration.isdigit() or start + int(duration) >= MINUTES_PER_DAY:
+            raise LessonError(f"неверная длительность '{duration}' (нужно число минут, урок - до полуночи)")
+        end = start + int(duration)
+    if end is not None and end <= start:
+        raise LessonError(f"время окончания {format_time(end)} должно быть позже начала {format_time(start)}")
+
+    day = str(raw.get('day') or '').strip()
+    weekday = parse_day(day)
+    if weekday is None:
+        raise LessonError(f"неизвестный день '{day}'")
+
+    subgroup = Subgroup.parse(raw.get('subgroup') or Subgroup.ALL)
+    if not isinstance(subgroup, Subgroup):
+        raise LessonError(f"неверная подгруппа '{subgroup}' (1, 2 или all)")
+
+    lesson = {'subject': subject, 'time': format_time(start), 'day': DAY_NAMES[weekday],
+              'subgroup': subgroup.value}
+    if end is not None:
+        lesson['end'] = format_time(end)
+    return lesson
+
+
+def canonical_lesson(raw: Mapping) -> Dict[str, Any]:
+    """Новый словарь урока: поля raw с каноничными subject/time/end/day/subgroup.
+
+    raw не меняется; duration уже учтена в end и не сохраняется.
+    LessonError - если поля некорректны.
+    """
+    lesson = {key: value for key, value in raw.items() if key not in ('end', 'duration')}
+    lesson.update(normalize_lesson(raw))
+    return lesson
+
+
+def _intern(value: Any) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Lesson(Mapping):
+    """Урок расписания с заранее разобранными полями.
+
+    Время, день и подгруппа разбираются один раз при загрузке: сортировки
+    и фильтры работают с числами и перечислением, а не перечитывают строки.
+    Повторяющиеся строки (предметы, дни, время) интернируются и хранятся
+    в одном экземпляре. Для остального кода урок - неизменяемый словарь:
+    lesson.get('subject'), lesson['time'], dict(lesson) работают как раньше.
+    """
+
+    __slots__ = ('id', 'subject', 'time', 'end', 'day', 'subgroup', 'created_at', 'updated_at',
+                 'extra', 'weekday', 'start', 'finish', 'day_key')
+
+    def __init__(self, subject: Optional[str] = None, time: Optional[str] = None,
+                 day: Optional[str] = None, id: int = 0, created_at: Optional[str] = None,
+                 subgroup: Any = Subgroup.ALL, updated_at: Optional[str] = None,
+                 extra: Optional[Dict[str, Any]] = None, end: Optional[str] = None):
+        self.id = id
+        self.subject = _intern(subject)
+        self.time = _intern(time)
+        self.end = _intern(end)
+        self.day = _intern(day)
+        self.subgroup = Subgroup.parse(subgroup)
+        self.created_at = created_at
+        self.updated_at = updated_at
+        # Поля, о которых база не знает, сохраняются как есть
+        self.extra = extra or None
+
+        # Новые уроки уже каноничны; старые записи разбираем так же терпимо, как /add
+        self.day_key = sys.intern(day_key(day or ''))
+        self.weekday = WEEKDAYS.get(self.day_key)
+        parsed = parse_time_range(time) if time is not None else None
+        self.start = parsed[0] if parsed else None
+        # Конец занятия в минутах; без указанного конца - стандартная пара
+        finish = parse_time(end) if end is not None else (parsed[1] if parsed else None)
+        if self.start is None:
+            finish = None
+        elif finish is None or finish <= self.start:
+            finish = self.start + DEFAULT_LESSON_MINUTES
+        self.finish = finish
+
+    @classmethod
+    def from_dict(cls, data: Any) -> 'Lesson':
+        if isinstance(data, Lesson):
+            return data
+        extra = {key: value for key, value in data.items() if key not in LESSON_FIELDS}
+        return cls(
+            data.get('subject'), data.get('time'), data.get('day'), data.get('id', 0),
+            data.get('created_at'), data.get('subgroup', Subgroup.ALL), data.get('updated_at'),
+            extra, data.get('end')
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь для записи в JSON"""
+        return dict(self)
+
+    @property
+    def time_text(self) -> str:
+        """Время для сообщений: 8:00 или 8:00–9:30"""
+        if self.end:
+            return f"{self.time}{TIME_RANGE_DASH}{self.end}"
+        return self.time or '--:--'
+
+    def sort_key(self) -> Tuple[int, int]:
+        """Порядок уроков внутри дня: время, затем id"""
+        return self.start if self.start is not None else 0, self.id
+
+    def week_key(self) -> Tuple[int, int, int]:
+        """Порядок уроков в неделе: день, время, id (неизвестные дни - в конце)"""
+        return (self.weekday if self.weekday is not None else len(WEEKDAYS),
+                self.start if self.start is not None else 0, self.id)
+
+    def matches_subgroup(self, subgroup: Any) -> bool:
+        """Виден ли урок в расписании подгруппы subgroup"""
+        return subgroup == Subgroup.ALL or self.subgroup is Subgroup.ALL or self.subgroup == subgroup
+
+    # ===== ДОСТУП КАК К СЛОВАРЮ =====
+    def __getitem__(self, key: str) -> Any:
+        if key in LESSON_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in LESSON_FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def __iter__(self) -> Iterator[str]:
+        for key in LESSON_FIELDS:
+            if getattr(self, key) is not None:
+                yield key
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Lesson({dict(self)!r})"
@@ -0,0 +1,259 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from database import ScheduleChange, DEFAULT_SUBGROUP
+from messages import format_reminder_message
+from models import Lesson, day_key
+
+REMINDER_LEAD_MINUTES = 15
+# Кучу чистим, когда устаревших записей в ней больше, чем живых
+HEAP_COMPACT_MIN = 64
+# Предел сна планировщика: страховка от перевода системных часов
+MAX_SLEEP = 3600
+
+
+def parse_utc_offset(value: str) -> timezone:
+    """Часовой пояс из строки вида 'UTC+3' (как в настройках пользователей)"""
+    match = re.fullmatch(r'\s*UTC\s*([+-]\d{1,2})(?::?(\d{2}))?\s*', value or '', re.IGNORECASE)
+    if not match:
+        return timezone.utc
+    hours = int(match.group(1))
+    minutes = int(match.group(2) or 0)
+    return timezone(timedelta(hours=hours, minutes=minutes if hours >= 0 else -minutes))
+
+
+class ReminderScheduler:
+    """Напоминания о занятиях на min-куче моментов срабатывания.
+
+    В куче лежит ближайшее напоминание о каждом уроке, а получатели
+    определяются в момент срабатывания по индексу подгрупп подписчиков,
+    поэтому размер кучи не зависит от числа пользователей. Урок, у которого
+    изменились день, время или updated_at, получает новое поколение;
+    устаревшие записи кучи пропускаются, а когда их становится больше
+    живых, куча пересобирается.
+    """
+
+    def __init__(self, db: Any, lead_minutes: int = REMINDER_LEAD_MINUTES,
+                 tz: Optional[timezone] = None):
+        # db - асинхронный фасад базы (см. AsyncScheduleDatabase)
+        self.db = db
+        self.send: Optional[Callable[[List[str], str], Awaitable[Any]]] = None
+        self.lead_minutes = lead_minutes
+        self.tz = tz or timezone.utc
+        self._heap: List[Tuple[float, int, int, int]] = []
+        self._seq = itertools.count()
+        self._lessons: Dict[int, Dict] = {}
+        self._generations: Dict[int, int] = {}
+        # Подгруппа -> подписчики, выбравшие её
+        self._subscribers: Dict[str, Set[str]] = {}
+        self._user_subgroups: Dict[str, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup = asyncio.Event()
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Версия расписания, по которой куча построена целиком
+        self._version = -1
+        self.sent = 0
+
+    # ===== ПОДПИСЧИКИ =====
+    def set_user(self, user_id: Any, subgroup: Optional[str], enabled: bool) -> None:
+        """Обновить подписку пользователя (после смены подгруппы или /reminders)"""
+        key = str(user_id)
+        old = self._user_subgroups.pop(key, None)
+        if old is not None:
+            self._subscribers.get(old, set()).discard(key)
+        if enabled:
+            subgroup = subgroup or DEFAULT_SUBGROUP
+            self._user_subgroups[key] = subgroup
+            self._subscribers.setdefault(subgroup, set()).add(key)
+
+    def _recipients(self, lesson: Dict) -> Set[str]:
+        subgroup = str(lesson.get('subgroup', 'all'))
+        if subgroup == 'all':
+            return set(self._user_subgroups)
+        # Урок подгруппы видят она сама и те, кто смотрит расписание для всех
+        return self._subscribers.get(subgroup, set()) | self._subscribers.get('all', set())
+
+    # ===== КУЧА =====
+    def _next_fire(self, lesson: Lesson, now: datetime) -> Optional[datetime]:
+        """Ближайший после now момент напоминания об уроке"""
+        if lesson.weekday is None or lesson.start is None:
+            return None
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        fire = midnight + timedelta(days=(lesson.weekday - now.weekday()) % 7,
+                                    minutes=lesson.start - self.lead_minutes)
+        while fire <= now:
+            fire += timedelta(days=7)
+        return fire
+
+    def _schedule(self, lesson: Dict, now: datetime) -> None:
+        lesson_id = lesson.get('id')
+        generation = self._generations.get(lesson_id, 0) + 1
+        self._generations[lesson_id] = generation
+        fire = self._next_fire(lesson, now)
+        if fire is None:
+            self._lessons.pop(lesson_id, None)
+            return
+        self._lessons[lesson_id] = lesson
+        entry = (fire.timestamp(), next(self._seq), lesson_id, generation)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            # Новое напоминание раньше всех - будим цикл, чтобы пересчитать сон
+            self._wakeup.set()
+        self._maybe_compact()
+
+    def _unschedule(self, lesson_id: int) -> None:
+        if self._lessons.pop(lesson_id, None) is not None:
+            self._generations[lesson_id] += 1
+            self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        """Выбросить устаревшие записи, если их больше, чем живых"""
+        if len(self._heap) > max(2 * len(self._lessons), HEAP_COMPACT_MIN):
+            self._heap = [entry for entry in self._heap if self._is_current(entry)]
+            heapq.heapify(self._heap)
+
+    @staticmethod
+    def _fire_inputs(lesson: Lesson) -> Tuple:
+        """От чего зависит момент напоминания; SQLite отдаёт новые объекты на каждый запрос"""
+        return lesson.day_key, lesson.start, lesson.get('updated_at')
+
+    def _is_current(self, entry: Tuple[float, int, int, int]) -> bool:
+        _, _, lesson_id, generation = entry
+        return lesson_id in self._lessons and self._generations.get(lesson_id) == generation
+
+    def pending(self) -> int:
+        """Сколько уроков ждут напоминания"""
+        return len(self._lessons)
+
+    # ===== ЗАГРУЗКА И ИЗМЕНЕНИЯ =====
+    async def reload(self) -> None:
+        """Полностью перестроить подписчиков и кучу по базе"""
+        async with self._refresh_lock:
+            await self._rebuild()
+
+    async def _rebuild(self) -> None:
+        self._version = await self.db.get_version()
+        users = await self.db.get_notification_users()
+        lessons = await self.db.get_all_lessons()
+        self._subscribers.clear()
+        self._user_subgroups.clear()
+        for user_id, subgroup in users.items():
+            self.set_user(user_id, subgroup, True)
+
+        self._heap.clear()
+        self._lessons.clear()
+        now = datetime.now(self.tz)
+        for lesson in lessons:
+            self._schedule(lesson, now)
+        self._wakeup.set()
+        logging.info(f"Напоминания: уроков {len(self._lessons)}, подписчиков {len(self._user_subgroups)}")
+
+    def on_change(self, change: ScheduleChange) -> None:
+        """Подписчик базы; вызывается из потока базы, поэтому только передаёт работу в цикл"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._loop.create_task, self._refresh(change))
+
+    async def _refresh(self, change: ScheduleChange) -> None:
+        """Пересчитать напоминания только для затронутых дней"""
+        async with self._refresh_lock:
+            if change.version <= self._version:
+                # Изменение уже учтено полной перестройкой
+                return
+            if change.days is None:
+                await self._rebuild()
+                return
+            for day in change.days:
+                lessons = await self.db.get_lessons_by_day_and_subgroup(day, 'all')
+                current = {lesson.get('id') for lesson in lessons}
+                key = day_key(day)
+                # Урок, перенесённый на другой день, придёт вместе с тем днём
+                for lesson_id, lesson in list(self._lessons.items()):
+                    if lesson_id not in current and lesson.day_key == key:
+                        self._unschedule(lesson_id)
+                now = datetime.now(self.tz)
+                for lesson in lessons:
+                    known = self._lessons.get(lesson.get('id'))
+                    if known is None or self._fire_inputs(known) != self._fire_inputs(lesson):
+                        self._schedule(lesson, now)
+                    else:
+                        # Момент напоминания прежний: меняем только сам урок (текст, подгруппу)
+                        self._lessons[lesson.get('id')] = lesson
+
+    # ===== ЦИКЛ =====
+    def _pop_due(self, now: float) -> List[Tuple[Tuple[float, int, int, int], Dict]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self._is_current(entry):
+                due.append((entry, self._lessons[entry[2]]))
+        return due
+
+    async def _fire(self, due: List[Tuple[Tuple[float, int, int, int], Dict]]) -> None:
+        """Разослать пачку наступивших напоминаний: одно сообщение на пользователя"""
+        now = time.time()
+        by_user: Dict[str, List[Dict]] = {}
+        for (fire_ts, *_), lesson in due:
+            # Если бот простоял дольше, чем до начала урока, напоминать поздно
+            if now - fire_ts < self.lead_minutes * 60:
+                for user_id in self._recipients(lesson):
+                    by_user.setdefault(user_id, []).append(lesson)
+
+        # Пользователи с одинаковым набором уроков получают один и тот же текст
+        by_lessons: Dict[Tuple, List[str]] = {}
+        for user_id, lessons in by_user.items():
+            by_lessons.setdefault(tuple(id(lesson) for lesson in lessons), []).append(user_id)
+        for user_ids in by_lessons.values():
+            text = format_reminder_message(by_user[user_ids[0]], self.lead_minutes)
+            try:
+                await self.send(user_ids, text)
+                self.sent += len(user_ids)
+            except Exception as e:
+                logging.error(f"Ошибка рассылки напоминаний: {e}")
+
+        # Следующее напоминание - через неделю
+        next_now = datetime.now(self.tz)
+        for entry, _ in due:
+            # Пока шла рассылка, урок могли изменить (он уже в куче заново) или удалить
+            if self._is_current(entry):
+                self._schedule(self._lessons[entry[2]], next_now)
+
+    async def run(self) -> None:
+        """Спать до ближайшего напоминания и рассылать наступившие пачкой"""
+        while True:
+            due = self._pop_due(time.time())
+            if due:
+                await self._fire(due)
+                continue
+
+            timeout = MAX_SLEEP
+            if self._heap:
+                timeout = min(max(self._heap[0][0] - time.time(), 0), MAX_SLEEP)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self, send: Callable[[List[str], str], Awaitable[Any]]) -> None:
+        """Загрузить расписание и запустить цикл; send(user_ids, text) - рассылка"""
+        self.send = send
+        self._loop = asyncio.get_running_loop()
+        await self.reload()
+        self._task = self._loop.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
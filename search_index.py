@@ -0,0 +1,167 @@
+import bisect
+import re
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from models import Lesson
+
+# Сколько опечаток прощаем в слове запроса в зависимости от его длины
+FUZZY_MIN_LENGTH = 4
+FUZZY_LONG_WORD = 8
+# Символ больше любой буквы: граница диапазона слов с общим префиксом
+PREFIX_END = '\uffff'
+
+
+def normalize_subject(text: str) -> List[str]:
+    """Слова названия в нижнем регистре, 'ё' приравнена к 'е'"""
+    return re.findall(r'\w+', str(text).lower().replace('ё', 'е'))
+
+
+def max_edits(word: str) -> int:
+    """Допустимое число опечаток: короткие слова - только точно"""
+    if len(word) < FUZZY_MIN_LENGTH:
+        return 0
+    return 1 if len(word) < FUZZY_LONG_WORD else 2
+
+
+def word_grams(word: str) -> Set[str]:
+    """Биграммы слова; '^' отмечает начало, чтобы учитывать первую букву"""
+    padded = '^' + word
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def prefix_distance(query: str, word: str, limit: int) -> int:
+    """Расстояние Левенштейна от query до ближайшего начала word (limit + 1, если больше limit)"""
+    row = list(range(len(query) + 1))
+    best = row[-1]
+    for char in word:
+        last, row = row, [row[0] + 1]
+        for j, query_char in enumerate(query, 1):
+            row.append(min(row[j - 1] + 1, last[j] + 1, last[j - 1] + (query_char != char)))
+        best = min(best, row[-1])
+        if min(row) > limit:
+            # Дальше по слову расстояние уже не уменьшится
+            break
+    return best if best <= limit else limit + 1
+
+
+class SubjectIndex:
+    """Поиск уроков по словам названия предмета.
+
+    Обратный индекс (слово -> id уроков) отвечает на точные совпадения,
+    отсортированный список слов - на префиксы: «мат» находит всё от «мат»
+    до «мат\\uffff» двумя бинарными поисками. Для опечаток кандидатов
+    отбирает индекс биграмм (слово с k опечатками теряет не больше 2k
+    биграмм), и только для них считается расстояние Левенштейна.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+        self._words: List[str] = []
+        self._lessons: Dict[int, Lesson] = {}
+        self._lesson_words: Dict[int, Tuple[str, ...]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._lessons)
+
+    # ===== ИЗМЕНЕНИЯ =====
+    def add(self, lesson: Lesson) -> None:
+        lesson_id = lesson.id
+        self.remove(lesson_id)
+        words = tuple(dict.fromkeys(normalize_subject(lesson.subject or '')))
+        self._lessons[lesson_id] = lesson
+        self._lesson_words[lesson_id] = words
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = set()
+                bisect.insort(self._words, word)
+                for gram in word_grams(word):
+                    self._grams.setdefault(gram, set()).add(word)
+            postings.add(lesson_id)
+
+    def remove(self, lesson_id: int) -> None:
+        if self._lessons.pop(lesson_id, None) is None:
+            return
+        for word in self._lesson_words.pop(lesson_id):
+            postings = self._postings[word]
+            postings.discard(lesson_id)
+            if not postings:
+                del self._postings[word]
+                del self._words[bisect.bisect_left(self._words, word)]
+                for gram in word_grams(word):
+                    self._grams[gram].discard(word)
+                    if not self._grams[gram]:
+                        del self._grams[gram]
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._words.clear()
+        self._lessons.clear()
+        self._lesson_words.clear()
+        self._grams.clear()
+
+    # ===== ПОИСК =====
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        return (bisect.bisect_left(self._words, prefix),
+                bisect.bisect_left(self._words, prefix + PREFIX_END))
+
+    def _fuzzy_words(self, query: str, limit: int) -> Iterator[Tuple[str, int]]:
+        """Слова индекса, начало которых отличается от query не более чем на limit правок"""
+        grams = word_grams(query)
+        # Каждая правка портит не больше двух биграмм запроса
+        need = len(grams) - 2 * limit
+        if need > 0:
+            counts = Counter()
+            for gram in grams:
+                counts.update(self._grams.get(gram, ()))
+            candidates = [word for word, shared in counts.items() if shared >= need]
+        else:
+            candidates = self._words
+        for word in candidates:
+            distance = prefix_distance(query, word, limit)
+            if distance <= limit:
+                yield word, distance
+
+    def _match_word(self, query: str, fuzzy: bool) -> Dict[int, int]:
+        """id уроков -> штраф: 0 - слово целиком, 1 - префикс, дальше - опечатки"""
+        scores: Dict[int, int] = {}
+        start, end = self._prefix_range(query)
+        for word in self._words[start:end]:
+            score = 0 if word == query else 1
+            for lesson_id in self._postings[word]:
+                if scores.get(lesson_id, score + 1) > score:
+                    scores[lesson_id] = score
+        if scores or not fuzzy:
+            return scores
+
+        limit = max_edits(query)
+        if limit:
+            for word, distance in self._fuzzy_words(query, limit):
+                for lesson_id in self._postings[word]:
+                    scores[lesson_id] = min(scores.get(lesson_id, distance + 1), distance + 1)
+        return scores
+
+    def search(self, query: str, fuzzy: bool = True, limit: Optional[int] = None) -> List[Lesson]:
+        """Уроки, в названии которых есть все слова запроса (или их начала), лучшие первыми"""
+        words = normalize_subject(query)
+        if not words:
+            return []
+
+        totals: Optional[Dict[int, int]] = None
+        # Длинные слова обычно встречаются реже: пересечение сразу становится маленьким
+        for word in sorted(dict.fromkeys(words), key=len, reverse=True):
+            scores = self._match_word(word, fuzzy)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {lesson_id: totals[lesson_id] + score
+                          for lesson_id, score in scores.items() if lesson_id in totals}
+            if not totals:
+                return []
+
+        ranked = sorted(totals, key=lambda lesson_id: (totals[lesson_id], lesson_id))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self._lessons[lesson_id] for lesson_id in ranked]
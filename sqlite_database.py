@@ -0,0 +1,575 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Optional, Any, Iterable, Iterator, Callable, Tuple
+
+from database import (
+    ScheduleDatabase, ScheduleChange, ChangeNotifier, UserSettingsBuffer,
+    DAYS_ORDER, USERS_FLUSH_INTERVAL, USER_SETTING_KEYS, VALID_SUBGROUPS
+)
+from conflicts import ConflictIndex
+from models import Lesson, LessonError, canonical_lesson, day_key, parse_start
+from search_index import SubjectIndex
+from stats import ScheduleStats
+
+# Поля урока со своими столбцами (end - в end_time); остальные лежат в extra (JSON)
+LESSON_COLUMNS = ('id', 'subject', 'time', 'end', 'day', 'subgroup', 'created_at', 'updated_at')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS lessons (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject TEXT NOT NULL DEFAULT '',
+    subject_key TEXT NOT NULL DEFAULT '',
+    time TEXT NOT NULL DEFAULT '',
+    time_minutes INTEGER NOT NULL DEFAULT 0,
+    end_time TEXT,
+    day TEXT NOT NULL DEFAULT '',
+    day_key TEXT NOT NULL DEFAULT '',
+    subgroup TEXT NOT NULL DEFAULT 'all',
+    created_at TEXT,
+    updated_at TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_lessons_day ON lessons (day_key, subgroup, time_minutes);
+CREATE INDEX IF NOT EXISTS idx_lessons_subgroup ON lessons (subgroup);
+CREATE INDEX IF NOT EXISTS idx_lessons_subject ON lessons (subject_key);
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    registered_at TEXT,
+    last_activity TEXT,
+    settings TEXT NOT NULL DEFAULT '{}'
+);
+'''
+
+# Условие "урок подходит для подгруппы" (см. ScheduleDatabase._lesson_matches_subgroup)
+SUBGROUP_FILTER = "(:subgroup = 'all' OR subgroup IN ('all', :subgroup))"
+
+
+class SQLiteScheduleDatabase(ChangeNotifier, UserSettingsBuffer):
+    """Хранилище расписания в SQLite с тем же интерфейсом, что и ScheduleDatabase"""
+
+    # Общие помощники не зависят от способа хранения
+    _lesson_matches_subgroup = ScheduleDatabase._lesson_matches_subgroup
+
+    def __init__(self, db_file: str = 'schedule.db', pool_size: int = 4,
+                 users_flush_interval: float = USERS_FLUSH_INTERVAL):
+        self.db_file = db_file
+        self.pool_size = pool_size
+        self._pool: queue.LifoQueue = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._connections_created = 0
+        self._subscribers: List[Callable[[ScheduleChange], None]] = []
+        # Индекс названий, статистика и индекс пересечений строятся в памяти
+        # при первом обращении и затем поддерживаются собственными
+        # изменениями; правки других процессов их сбрасывают
+        self._subjects: Optional[SubjectIndex] = None
+        self._stats: Optional[ScheduleStats] = None
+        self._conflicts: Optional[ConflictIndex] = None
+        self._memory_revision = -1
+        self._memory_lock = threading.Lock()
+        self._init_users_buffer(users_flush_interval)
+        self.ensure_db_exists()
+        self._load_user_map()
+        # Последняя версия, о которой уже сообщили подписчикам
+        self._seen_revision = self.get_version()
+
+    # ===== СОЕДИНЕНИЯ =====
+    def _new_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, timeout=30)
+        conn.row_factory = sqlite3.Row
+        # WAL: читатели не блокируют писателя и друг друга
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Взять соединение из пула (не больше pool_size одновременно)"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._pool_lock:
+                if self._connections_created < self.pool_size:
+                    conn = self._new_connection()
+                    self._connections_created += 1
+            if conn is None:
+                conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def ensure_db_exists(self) -> None:
+        """Создаёт таблицы БД если их нет"""
+        with self._connection() as conn, conn:
+            conn.executescript(SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(lessons)')}
+            if 'end_time' not in columns:
+                # База создана до появления времени окончания
+                conn.execute('ALTER TABLE lessons ADD COLUMN end_time TEXT')
+            table_sql = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'lessons'"
+            ).fetchone()[0]
+            if 'AUTOINCREMENT' not in table_sql.upper():
+                self._rebuild_lessons_table(conn)
+            now = datetime.now().isoformat()
+            conn.executemany(
+                'INSERT OR IGNORE INTO metadata (key, value) VALUES (?, ?)',
+                [('created_at', now), ('last_modified', now), ('version', '2.0')]
+            )
+
+    @staticmethod
+    def _rebuild_lessons_table(conn: sqlite3.Connection) -> None:
+        """Пересоздать таблицу уроков с AUTOINCREMENT (база из старой версии).
+
+        Без AUTOINCREMENT SQLite снова выдаёт id удалённого последнего урока,
+        а JSON-база - нет: одни и те же действия давали бы разные id.
+        """
+        columns = ', '.join(row['name'] for row in conn.execute('PRAGMA table_info(lessons)'))
+        # executescript сам фиксирует транзакцию, поэтому схему - по одной команде
+        conn.execute('BEGIN')
+        conn.execute('ALTER TABLE lessons RENAME TO lessons_old')
+        for name in ('idx_lessons_day', 'idx_lessons_subgroup', 'idx_lessons_subject'):
+            conn.execute(f'DROP INDEX {name}')
+        for statement in SCHEMA.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        conn.execute(f'INSERT INTO lessons ({columns}) SELECT {columns} FROM lessons_old')
+        conn.execute('DROP TABLE lessons_old')
+
+    def close(self) -> None:
+        """Записать отложенные настройки и закрыть все соединения пула"""
+        self.flush_users()
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            # Соединения, занятые другими потоками, вернутся в пул и останутся
+            # в счёте: иначе пул открыл бы больше pool_size соединений
+            with self._pool_lock:
+                self._connections_created -= 1
+
+    # ===== ПРЕОБРАЗОВАНИЕ СТРОК =====
+    def _lesson_params(self, lesson: Dict) -> Dict[str, Any]:
+        extra = {k: v for k, v in lesson.items() if k not in LESSON_COLUMNS}
+        return {
+            'id': lesson.get('id'),
+            'subject': lesson.get('subject', ''),
+            'subject_key': lesson.get('subject', '').lower(),
+            'time': lesson.get('time', ''),
+            'time_minutes': parse_start(lesson.get('time', '')) or 0,
+            'end_time': lesson.get('end'),
+            'day': lesson.get('day', ''),
+            'day_key': day_key(lesson.get('day', '')),
+            'subgroup': str(lesson.get('subgroup', 'all')),
+            'created_at': lesson.get('created_at'),
+            'updated_at': lesson.get('updated_at'),
+            'extra': json.dumps(extra, ensure_ascii=False) if extra else None,
+        }
+
+    @staticmethod
+    def _row_to_lesson(row: sqlite3.Row) -> Lesson:
+        return Lesson(
+            row['subject'], row['time'], row['day'], row['id'], row['created_at'],
+            row['subgroup'], row['updated_at'], json.loads(row['extra']) if row['extra'] else None,
+            row['end_time']
+        )
+
+    def _query(self, sql: str, params: Any = ()) -> List[Lesson]:
+        with self._connection() as conn:
+            return [self._row_to_lesson(row) for row in conn.execute(sql, params)]
+
+    def _touch(self, conn: sqlite3.Connection) -> int:
+        """Отметить изменение базы; возвращает новую версию расписания"""
+        conn.execute(
+            "UPDATE metadata SET value = ? WHERE key = 'last_modified'",
+            (datetime.now().isoformat(),)
+        )
+        # Версия расписания общая для всех процессов, работающих с базой
+        conn.execute(
+            "INSERT INTO metadata (key, value) VALUES ('revision', '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+        return int(conn.execute("SELECT value FROM metadata WHERE key = 'revision'").fetchone()[0])
+
+    def _changed(self, revision: int, lessons: List[Dict]) -> None:
+        """Сообщить подписчикам о собственном изменении уроков lessons"""
+        self._seen_revision = max(self._seen_revision, revision)
+        self._notify(
+            revision,
+            {lesson.get('day', '') for lesson in lessons},
+            {str(lesson.get('subgroup', 'all')) for lesson in lessons}
+        )
+
+    def _update_memory(self, revision: int, removed: Iterable[Dict] = (),
+                       added: Iterable[Dict] = ()) -> None:
+        """Перенести собственное изменение в индекс названий и статистику"""
+        with self._memory_lock:
+            if self._subjects is None:
+                return
+            if self._memory_revision != revision - 1:
+                # Между нами был чужой коммит - всё перестроится при обращении
+                self._subjects = self._stats = self._conflicts = None
+                return
+            for lesson in removed:
+                self._subjects.remove(lesson['id'])
+                self._stats.remove(lesson)
+                self._conflicts.remove(lesson)
+            for lesson in added:
+                # Храним урок в том виде, в каком его вернёт чтение из базы
+                lesson = self._row_to_lesson(self._lesson_params(lesson))
+                self._subjects.add(lesson)
+                self._stats.add(lesson)
+                self._conflicts.add(lesson)
+            self._memory_revision = revision
+
+    def _ensure_memory(self) -> None:
+        """Построить индексы в памяти, если они отстали от базы (под _memory_lock)"""
+        if self._subjects is not None and self._memory_revision == self.get_version():
+            return
+        # Версия и уроки читаются одним снимком, иначе изменение, попавшее
+        # между ними, было бы учтено дважды
+        with self._connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                row = conn.execute("SELECT value FROM metadata WHERE key = 'revision'").fetchone()
+                lessons = [self._row_to_lesson(r) for r in conn.execute('SELECT * FROM lessons ORDER BY id')]
+            finally:
+                conn.execute('COMMIT')
+        self._subjects = SubjectIndex()
+        self._stats = ScheduleStats(VALID_SUBGROUPS)
+        self._conflicts = ConflictIndex()
+        for lesson in lessons:
+            self._subjects.add(lesson)
+            self._stats.add(lesson)
+            self._conflicts.add(lesson)
+        self._memory_revision = int(row['value']) if row else 0
+
+    # ===== ПОЛЬЗОВАТЕЛИ =====
+    def _load_user_map(self) -> None:
+        with self._connection() as conn:
+            rows = conn.execute('SELECT user_id, settings FROM users').fetchall()
+        self._reset_user_map({row['user_id']: json.loads(row['settings']) for row in rows})
+
+    def _write_users(self, batch: Dict[str, Dict]) -> None:
+        now = datetime.now().isoformat()
+        with self._connection() as conn, conn:
+            for user_id, changes in batch.items():
+                row = conn.execute('SELECT settings FROM users WHERE user_id = ?', (user_id,)).fetchone()
+                settings = json.loads(row['settings']) if row else {'notifications': False, 'timezone': 'UTC+3'}
+                settings.update({k: v for k, v in changes.items() if k in USER_SETTING_KEYS})
+                conn.execute(
+                    'INSERT INTO users (user_id, username, first_name, registered_at, last_activity, settings) '
+                    'VALUES (:user_id, :username, :first_name, :now, :now, :settings) '
+                    'ON CONFLICT (user_id) DO UPDATE SET '
+                    'username = COALESCE(:username, username), '
+                    'first_name = COALESCE(:first_name, first_name), '
+                    'last_activity = :now, settings = :settings',
+                    {
+                        'user_id': user_id,
+                        'username': changes.get('username'),
+                        'first_name': changes.get('first_name'),
+                        'now': now,
+                        'settings': json.dumps(settings, ensure_ascii=False),
+                    }
+                )
+
+    # ===== ОСНОВНЫЕ МЕТОДЫ =====
+    def get_version(self) -> int:
+        """Версия расписания: меняется при любом изменении, в том числе из других процессов"""
+        with self._connection() as conn:
+            row = conn.execute("SELECT value FROM metadata WHERE key = 'revision'").fetchone()
+        revision = int(row['value']) if row else 0
+
+        # Базу изменил другой процесс - неизвестно что именно, сообщаем обо всём
+        if self._subscribers and revision > self._seen_revision:
+            self._seen_revision = revision
+            self._notify(revision)
+        return revision
+
+    def add_lesson(self, lesson_data: Dict) -> Dict:
+        """Добавить урок с подгруппой; время и день приводятся к каноничному виду"""
+        try:
+            lesson_data = canonical_lesson(lesson_data)
+        except LessonError as e:
+            return {'success': False, 'error': str(e)}
+
+        lesson_data['created_at'] = datetime.now().isoformat()
+        lesson_data.pop('id', None)
+
+        params = self._lesson_params(lesson_data)
+        with self._connection() as conn, conn:
+            cursor = conn.execute(
+                'INSERT INTO lessons (subject, subject_key, time, time_minutes, end_time, day, day_key, '
+                'subgroup, created_at, updated_at, extra) VALUES (:subject, :subject_key, :time, '
+                ':time_minutes, :end_time, :day, :day_key, :subgroup, :created_at, :updated_at, :extra)',
+                params
+            )
+            revision = self._touch(conn)
+        lesson_data['id'] = cursor.lastrowid
+        self._update_memory(revision, added=[lesson_data])
+        self._changed(revision, [lesson_data])
+        return {'success': True, 'lesson_id': cursor.lastrowid}
+
+    def add_lessons(self, lessons: List[Dict]) -> Dict:
+        """Добавить много уроков одной транзакцией (импорт); некорректный урок отменяет всё"""
+        try:
+            lessons = [canonical_lesson(lesson_data) for lesson_data in lessons]
+        except LessonError as e:
+            return {'success': False, 'error': str(e)}
+        if not lessons:
+            return {'success': True, 'lesson_ids': [], 'conflicts': 0}
+
+        now = datetime.now().isoformat()
+        with self._connection() as conn, conn:
+            for lesson_data in lessons:
+                lesson_data['created_at'] = now
+                lesson_data.pop('id', None)
+                cursor = conn.execute(
+                    'INSERT INTO lessons (subject, subject_key, time, time_minutes, end_time, day, day_key, '
+                    'subgroup, created_at, updated_at, extra) VALUES (:subject, :subject_key, :time, '
+                    ':time_minutes, :end_time, :day, :day_key, :subgroup, :created_at, :updated_at, :extra)',
+                    self._lesson_params(lesson_data)
+                )
+                lesson_data['id'] = cursor.lastrowid
+            revision = self._touch(conn)
+        self._update_memory(revision, added=lessons)
+        self._changed(revision, lessons)
+        with self._memory_lock:
+            self._ensure_memory()
+            # Каждый новый урок проверяется по индексу - O(log n) на урок
+            conflicts = sum(1 for lesson in map(Lesson.from_dict, lessons) if self._conflicts.find(lesson))
+        return {'success': True, 'lesson_ids': [lesson['id'] for lesson in lessons], 'conflicts': conflicts}
+
+    def delete_lesson(self, lesson_id: int) -> bool:
+        return self.delete_lesson_returning(lesson_id) is not None
+
+    def delete_lesson_returning(self, lesson_id: int) -> Optional[Lesson]:
+        """Удалить урок одной транзакцией и вернуть его (None - урока нет)"""
+        with self._connection() as conn, conn:
+            row = conn.execute('SELECT * FROM lessons WHERE id = ?', (lesson_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('DELETE FROM lessons WHERE id = ?', (lesson_id,))
+            revision = self._touch(conn)
+        lesson = self._row_to_lesson(row)
+        self._update_memory(revision, removed=[lesson])
+        self._changed(revision, [lesson])
+        return lesson
+
+    def get_all_lessons(self) -> List[Lesson]:
+        """Получить все уроки из базы"""
+        return self._query('SELECT * FROM lessons ORDER BY id')
+
+    def get_lesson_by_id(self, lesson_id: int) -> Optional[Lesson]:
+        lessons = self._query('SELECT * FROM lessons WHERE id = ?', (lesson_id,))
+        return lessons[0] if lessons else None
+
+    def update_lesson(self, lesson_id: int, updated_data: Dict) -> Dict:
+        """Обновить данные урока; без подгруппы урок остаётся в прежней"""
+        with self._connection() as conn, conn:
+            row = conn.execute('SELECT * FROM lessons WHERE id = ?', (lesson_id,)).fetchone()
+            if row is None:
+                return {'success': False, 'error': f"урок с ID {lesson_id} не найден", 'not_found': True}
+
+            try:
+                updated_data = canonical_lesson({'subgroup': row['subgroup'], **updated_data})
+            except LessonError as e:
+                return {'success': False, 'error': str(e)}
+            # Сохраняем системные поля
+            updated_data['id'] = lesson_id
+            updated_data['created_at'] = row['created_at']
+            updated_data['updated_at'] = datetime.now().isoformat()
+
+            conn.execute(
+                'UPDATE lessons SET subject = :subject, subject_key = :subject_key, time = :time, '
+                'time_minutes = :time_minutes, end_time = :end_time, day = :day, day_key = :day_key, '
+                'subgroup = :subgroup, created_at = :created_at, updated_at = :updated_at, '
+                'extra = :extra WHERE id = :id',
+                self._lesson_params(updated_data)
+            )
+            revision = self._touch(conn)
+        old_lesson = self._row_to_lesson(row)
+        self._update_memory(revision, removed=[old_lesson], added=[updated_data])
+        self._changed(revision, [old_lesson, updated_data])
+        return {'success': True}
+
+    # ===== МЕТОДЫ ДЛЯ ПОДГРУПП =====
+    def get_lessons_by_day_and_subgroup(self, day: str, subgroup: str = 'all') -> List[Lesson]:
+        """Получить уроки для конкретного дня и подгруппы"""
+        return self._query(
+            f'SELECT * FROM lessons WHERE day_key = :day AND {SUBGROUP_FILTER} '
+            'ORDER BY time_minutes, id',
+            {'day': day_key(day), 'subgroup': str(subgroup)}
+        )
+
+    def get_all_days_with_lessons_for_subgroup(self, subgroup: str = 'all') -> List[str]:
+        """Получить все дни недели с уроками для указанной подгруппы"""
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT DISTINCT day_key FROM lessons WHERE day_key != '' AND {SUBGROUP_FILTER}",
+                {'subgroup': str(subgroup)}
+            ).fetchall()
+        sorted_days = sorted((row['day_key'] for row in rows), key=lambda x: DAYS_ORDER.get(x, 99))
+        return [day.capitalize() for day in sorted_days]
+
+    def get_weeks_for_subgroups(self, subgroups: List[str]) -> Dict[str, Dict[str, List[Lesson]]]:
+        """Расписание на неделю сразу для нескольких подгрупп одним запросом"""
+        if len(subgroups) == 1:
+            lessons = self._query(
+                f"SELECT * FROM lessons WHERE day_key != '' AND {SUBGROUP_FILTER}",
+                {'subgroup': str(subgroups[0])}
+            )
+        else:
+            lessons = self._query("SELECT * FROM lessons WHERE day_key != ''")
+
+        weeks = {subgroup: {} for subgroup in subgroups}
+        for lesson in sorted(lessons, key=Lesson.week_key):
+            # Как в JSON-базе: день по каноничному ключу, а не по записи в уроке
+            day = lesson.day_key.capitalize()
+            for subgroup in subgroups:
+                if self._lesson_matches_subgroup(lesson, subgroup):
+                    weeks[subgroup].setdefault(day, []).append(lesson)
+        return weeks
+
+    def get_week_for_subgroup(self, subgroup: str = 'all') -> Dict[str, List[Lesson]]:
+        """Расписание подгруппы на неделю: {день: уроки по времени}"""
+        return self.get_weeks_for_subgroups([subgroup])[subgroup]
+
+    def get_stats_for_subgroup(self, subgroup: str = 'all') -> Dict[str, Any]:
+        """Статистика по расписанию для указанной подгруппы (из готовых агрегатов)"""
+        with self._memory_lock:
+            self._ensure_memory()
+            if not self._stats.has_view(subgroup):
+                self._stats.add_view(subgroup, self.get_all_lessons())
+            return self._stats.get(subgroup)
+
+    # ===== ПЕРЕСЕЧЕНИЯ ПО ВРЕМЕНИ =====
+    def find_conflicts(self, lesson_id: int) -> List[Lesson]:
+        """Уроки, которые идут одновременно с уроком lesson_id у той же подгруппы"""
+        lesson = self.get_lesson_by_id(lesson_id)
+        if lesson is None:
+            return []
+        with self._memory_lock:
+            self._ensure_memory()
+            return self._conflicts.find(lesson)
+
+    def get_conflicts(self, subgroup: str = 'all') -> List[Tuple[Lesson, Lesson]]:
+        """Все пары пересекающихся уроков, которые видит подгруппа"""
+        with self._memory_lock:
+            self._ensure_memory()
+            return self._conflicts.conflicts(subgroup)
+
+    # ===== ДОПОЛНИТЕЛЬНЫЕ МЕТОДЫ =====
+    def search_lessons(self, query: str, subgroup: str = 'all', fuzzy: bool = True) -> List[Lesson]:
+        """Поиск уроков по словам названия предмета (с началом слов и опечатками)"""
+        with self._memory_lock:
+            self._ensure_memory()
+            matches = self._subjects.search(query, fuzzy)
+        return [lesson for lesson in matches if self._lesson_matches_subgroup(lesson, subgroup)]
+
+    def get_all_subgroups(self) -> List[str]:
+        """Получить все существующие подгруппы"""
+        with self._connection() as conn:
+            rows = conn.execute('SELECT DISTINCT subgroup FROM lessons ORDER BY subgroup').fetchall()
+        return [row['subgroup'] for row in rows]
+
+    def get_lessons_by_subgroup(self, subgroup: str) -> List[Lesson]:
+        """Получить все уроки для указанной подгруппы"""
+        return self._query(
+            f'SELECT * FROM lessons WHERE {SUBGROUP_FILTER} ORDER BY id',
+            {'subgroup': str(subgroup)}
+        )
+
+    def migrate_to_subgroups(self) -> bool:
+        """В SQLite у каждого урока уже есть подгруппа (по умолчанию 'all')"""
+        return True
+
+    def migrate_from_json(self, json_file: str = 'schedule.json') -> int:
+        """Одноразовый перенос уроков и пользователей из JSON-базы.
+
+        Перенос отмечается ключом migrated_from_json в metadata: после него
+        (или если базой уже пользовались) JSON больше не читается, даже если
+        все уроки удалят.
+        """
+        with self._connection() as conn, conn:
+            if conn.execute("SELECT 1 FROM metadata WHERE key = 'migrated_from_json'").fetchone():
+                return 0
+            in_use = conn.execute('SELECT COUNT(*) FROM lessons').fetchone()[0] or \
+                conn.execute("SELECT 1 FROM metadata WHERE key = 'revision'").fetchone()
+            if in_use or not os.path.exists(json_file):
+                self._mark_migrated(conn, None)
+                return 0
+
+            # Через ScheduleDatabase, чтобы накатить и журнал, а не только снимок
+            source = ScheduleDatabase(json_file, journal=True)
+            lessons = source.get_all_lessons()
+            users = source.get_users()
+            last_lesson_id = source.get_last_lesson_id()
+
+            conn.executemany(
+                'INSERT OR IGNORE INTO users (user_id, username, first_name, registered_at, '
+                'last_activity, settings) VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (user_id, user.get('username'), user.get('first_name'), user.get('registered_at'),
+                     user.get('last_activity'), json.dumps(user.get('settings', {}), ensure_ascii=False))
+                    for user_id, user in users.items()
+                ]
+            )
+
+            rows = [self._lesson_params(lesson) for lesson in lessons]
+            conn.executemany(
+                'INSERT INTO lessons (id, subject, subject_key, time, time_minutes, end_time, day, day_key, '
+                'subgroup, created_at, updated_at, extra) VALUES (:id, :subject, :subject_key, '
+                ':time, :time_minutes, :end_time, :day, :day_key, :subgroup, :created_at, :updated_at, :extra)',
+                rows
+            )
+            # id удалённых в JSON-базе уроков тоже не выдаём повторно
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = 'lessons'")
+            conn.execute(
+                "INSERT INTO sqlite_sequence (name, seq) "
+                "SELECT 'lessons', MAX(?, COALESCE(MAX(id), 0)) FROM lessons",
+                (last_lesson_id,)
+            )
+            self._mark_migrated(conn, json_file)
+            revision = self._touch(conn)
+        self._seen_revision = max(self._seen_revision, revision)
+        self._notify(revision)
+        self._load_user_map()
+        return len(rows)
+
+    @staticmethod
+    def _mark_migrated(conn: sqlite3.Connection, json_file: Optional[str]) -> None:
+        """Запомнить, что перенос из JSON выполнен (или не нужен)"""
+        conn.execute(
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES ('migrated_from_json', ?)",
+            (json.dumps({'source': json_file, 'at': datetime.now().isoformat()}),)
+        )
+
+    # ===== МЕТОДЫ ДЛЯ СОРТИРОВКИ (для команды /all) =====
+    def get_all_lessons_sorted(self) -> List[Lesson]:
+        """Получить все уроки, отсортированные по дню и времени"""
+        return sorted(self._query('SELECT * FROM lessons'), key=Lesson.week_key)
+
+    # ===== МЕТОДЫ ДЛЯ СОВМЕСТИМОСТИ =====
+    def get_lessons_by_day(self, day: str) -> List[Lesson]:
+        return self.get_lessons_by_day_and_subgroup(day, 'all')
+
+    def get_all_days_with_lessons(self) -> List[str]:
+        return self.get_all_days_with_lessons_for_subgroup('all')
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.get_stats_for_subgroup('all')
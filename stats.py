@@ -0,0 +1,133 @@
+import bisect
+from typing import Any, Dict, Iterable, List, Tuple
+
+from models import DEFAULT_LESSON_MINUTES, WEEKDAYS, Lesson, Subgroup
+
+# Перерыв не короче часа между занятиями одного дня считаем «окном»
+WINDOW_MINUTES = 60
+
+
+def lesson_duration(lesson: Lesson) -> int:
+    """Длительность в минутах; без времени окончания - стандартная пара"""
+    if lesson.start is None:
+        return DEFAULT_LESSON_MINUTES
+    return lesson.finish - lesson.start
+
+
+def _bump(counter: Dict[Any, int], key: Any, delta: int) -> None:
+    count = counter.get(key, 0) + delta
+    if count:
+        counter[key] = count
+    else:
+        counter.pop(key, None)
+
+
+class _ViewStats:
+    """Агрегаты одного представления расписания (подгруппы)"""
+
+    def __init__(self):
+        self.total = 0
+        self.minutes = 0
+        # День (как записан в уроке) -> число уроков; предмет -> число уроков
+        self.days: Dict[str, int] = {}
+        self.subjects: Dict[str, int] = {}
+        # День -> занятия по времени: (начало, id, конец)
+        self.timelines: Dict[str, List[Tuple[int, int, int]]] = {}
+        self.windows = 0
+        self.window_minutes = 0
+
+    def _count_gap(self, before: Tuple, after: Tuple, sign: int) -> None:
+        gap = after[0] - before[2]
+        if gap >= WINDOW_MINUTES:
+            self.windows += sign
+            self.window_minutes += sign * gap
+
+    def update(self, lesson: Lesson, sign: int) -> None:
+        """Учесть урок (sign=1) или забыть его (sign=-1)"""
+        self.total += sign
+        self.minutes += sign * lesson_duration(lesson)
+        _bump(self.days, lesson.get('day', 'Не указан'), sign)
+        _bump(self.subjects, lesson.get('subject', ''), sign)
+
+        start = lesson.start
+        if start is None:
+            return
+        day = lesson.day_key
+        entry = (start, lesson.id, start + lesson_duration(lesson))
+        timeline = self.timelines.setdefault(day, [])
+        i = bisect.bisect_left(timeline, entry)
+        if sign < 0:
+            del timeline[i]
+        # Меняются только перерывы вокруг вставленного или удалённого занятия
+        before = timeline[i - 1] if i else None
+        after = timeline[i] if i < len(timeline) else None
+        if before is not None and after is not None:
+            self._count_gap(before, after, -sign)
+        if before is not None:
+            self._count_gap(before, entry, sign)
+        if after is not None:
+            self._count_gap(entry, after, sign)
+        if sign > 0:
+            timeline.insert(i, entry)
+        elif not timeline:
+            del self.timelines[day]
+
+
+class ScheduleStats:
+    """Статистика расписания, которая поддерживается при каждом изменении.
+
+    Урок учитывается во всех представлениях, где он виден: урок для всех -
+    в каждом, урок подгруппы - в ней самой и в 'all'. Добавление и удаление
+    стоят O(1) на представление (плюс вставка в список занятий дня), а
+    выдача статистики не зависит от размера расписания.
+    """
+
+    def __init__(self, views: Iterable[str] = ('all',)):
+        self._views: Dict[str, _ViewStats] = {str(view): _ViewStats() for view in views}
+
+    def _targets(self, lesson: Lesson) -> Iterable[_ViewStats]:
+        if lesson.subgroup is Subgroup.ALL:
+            return self._views.values()
+        return [stats for view, stats in self._views.items() if view in ('all', lesson.subgroup)]
+
+    def add(self, lesson: Lesson) -> None:
+        for stats in self._targets(lesson):
+            stats.update(lesson, 1)
+
+    def remove(self, lesson: Lesson) -> None:
+        for stats in self._targets(lesson):
+            stats.update(lesson, -1)
+
+    def has_view(self, view: str) -> bool:
+        return str(view) in self._views
+
+    def add_view(self, view: str, lessons: Iterable[Lesson]) -> None:
+        """Начать вести представление, которого не было (одна проходка по урокам)"""
+        stats = self._views[str(view)] = _ViewStats()
+        subgroup = Subgroup.parse(view)
+        for lesson in lessons:
+            if lesson.matches_subgroup(subgroup):
+                stats.update(lesson, 1)
+
+    def get(self, subgroup: str = 'all') -> Dict[str, Any]:
+        stats = self._views[str(subgroup)]
+        busiest = None
+        if stats.days:
+            # При равенстве - более ранний день недели
+            busiest = max(stats.days, key=lambda day: (
+                stats.days[day], -WEEKDAYS.get(str(day).strip().lower(), len(WEEKDAYS))
+            ))
+        starts = [timeline[0][0] for timeline in stats.timelines.values()]
+        earliest = min(starts) if starts else None
+        return {
+            'total_lessons': stats.total,
+            'days_with_lessons': len(stats.days),
+            'subjects_count': len(stats.subjects),
+            'lessons_by_day': dict(stats.days),
+            'most_busy_day': busiest,
+            'contact_hours': round(stats.minutes / 60, 1),
+            'windows': stats.windows,
+            'window_minutes': stats.window_minutes,
+            'earliest_start': f"{earliest // 60}:{earliest % 60:02d}" if earliest is not None else None,
+            'subgroup': subgroup,
+        }
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# Модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_lesson():
+    """Сырые поля урока, как их передают в add_lesson"""
+    def make(subject: str, time: str = '8:00', day: str = 'Понедельник', subgroup: str = 'all') -> dict:
+        return {'subject': subject, 'time': time, 'day': day, 'subgroup': subgroup}
+    return make
+
+
+@pytest.fixture
+def new_lesson():
+    """Урок Lesson с очередным id - для индексов, которые работают без базы"""
+    from models import Lesson
+    ids = iter(range(1, 10 ** 6))
+
+    def make(subject: str, time: str = '8:00', day: str = 'Понедельник', subgroup: str = 'all',
+             end: str = None) -> Lesson:
+        return Lesson(subject, time, day, next(ids), subgroup=subgroup, end=end)
+    return make
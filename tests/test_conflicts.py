@@ -0,0 +1,60 @@
+from conflicts import ConflictIndex, lessons_overlap
+
+
+def _index(*lessons):
+    index = ConflictIndex()
+    for lesson in lessons:
+        index.add(lesson)
+    return index
+
+
+def test_touching_lessons_do_not_overlap(new_lesson):
+    first = new_lesson('Алгебра', '8:00', end='9:30')
+    second = new_lesson('Физика', '9:30', end='11:00')
+    index = _index(first, second)
+    assert not lessons_overlap(first, second)
+    assert index.find(first) == [] and index.find(second) == []
+    assert index.conflicts() == []
+
+
+def test_one_minute_overlap(new_lesson):
+    first = new_lesson('Алгебра', '8:00', end='9:30')
+    second = new_lesson('Физика', '9:29')
+    index = _index(first, second)
+    assert index.find(second) == [first]
+    assert index.conflicts() == [(first, second)]
+
+
+def test_long_lesson_found_from_short_one(new_lesson):
+    # Окно поиска расширяется на самое длинное занятие дня
+    long = new_lesson('Практика', '8:00', end='14:00')
+    short = new_lesson('Консультация', '13:00', end='13:30')
+    index = _index(long, new_lesson('Физика', '10:00', 'Вторник'), short)
+    assert index.find(short) == [long]
+
+
+def test_subgroups(new_lesson):
+    first = new_lesson('Алгебра', '8:00', subgroup='1')
+    second = new_lesson('Физика', '8:00', subgroup='2')
+    common = new_lesson('Лекция', '9:00', subgroup='all')
+    index = _index(first, second, common)
+    # Подгруппы 1 и 2 не мешают друг другу, урок для всех - обеим
+    assert index.find(first) == [common]
+    assert index.find(common) == [first, second]
+    assert index.conflicts('1') == [(first, common)]
+    assert index.conflicts('2') == [(second, common)]
+    assert index.conflicts('all') == [(first, common), (second, common)]
+
+
+def test_other_day_and_remove(new_lesson):
+    monday = new_lesson('Алгебра', '8:00')
+    tuesday = new_lesson('Алгебра', '8:00', 'Вторник')
+    index = _index(monday, tuesday)
+    assert index.conflicts() == []
+
+    clash = new_lesson('Физика', '8:30')
+    index.add(clash)
+    assert index.find(monday) == [clash]
+    index.remove(clash)
+    assert index.find(monday) == []
+    assert len(index) == 2
@@ -0,0 +1,53 @@
+import json
+import os
+import stat
+
+from database import ScheduleDatabase
+
+
+def test_journal_torn_tail_is_truncated(tmp_path, make_lesson):
+    db_file = str(tmp_path / 'schedule.json')
+    db = ScheduleDatabase(db_file, journal=True)
+    assert db.add_lesson(make_lesson('Алгебра'))['success']
+
+    # Сбой посреди дозаписи: последняя строка журнала оборвана
+    with open(db.journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"op":"add","les')
+
+    db = ScheduleDatabase(db_file, journal=True)
+    assert [l['subject'] for l in db.get_all_lessons()] == ['Алгебра']
+    assert db.add_lesson(make_lesson('Физика', '10:00'))['success']
+
+    with open(db.journal_file, encoding='utf-8') as f:
+        for line in f:
+            json.loads(line)
+
+    db = ScheduleDatabase(db_file, journal=True)
+    assert [l['subject'] for l in db.get_all_lessons()] == ['Алгебра', 'Физика']
+
+
+def test_new_file_honours_umask(tmp_path):
+    old_mask = os.umask(0o022)
+    try:
+        db = ScheduleDatabase(str(tmp_path / 'schedule.json'))
+    finally:
+        os.umask(old_mask)
+    assert stat.S_IMODE(os.stat(db.db_file).st_mode) == 0o644
+
+
+def test_write_methods_report_errors_without_touching_input(tmp_path, make_lesson):
+    db = ScheduleDatabase(str(tmp_path / 'schedule.json'))
+    lesson_id = db.add_lesson(make_lesson('Алгебра'))['lesson_id']
+
+    bad = {'subject': 'Физика', 'time': '25:00', 'day': 'пн'}
+    assert db.add_lesson(dict(bad))['success'] is False
+    assert db.add_lessons([dict(bad)])['success'] is False
+    result = db.update_lesson(lesson_id, bad)
+    assert result['success'] is False and result['error']
+    assert db.update_lesson(999, make_lesson('Физика')).get('not_found')
+
+    raw = {'subject': 'Физика', 'time': '10:00+45', 'day': 'ср'}
+    assert db.update_lesson(lesson_id, raw)['success']
+    assert raw == {'subject': 'Физика', 'time': '10:00+45', 'day': 'ср'}
+    lesson = db.get_lesson_by_id(lesson_id)
+    assert (lesson.day, lesson.time, lesson.end, 'duration' in lesson) == ('Среда', '10:00', '10:45', False)
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from async_database import AsyncScheduleDatabase
+from database import ScheduleChange
+from reminders import ReminderScheduler, parse_utc_offset
+from sqlite_database import SQLiteScheduleDatabase
+
+TZ = timezone(timedelta(hours=3))
+# Понедельник, 10:00
+MONDAY_10 = datetime(2026, 10, 19, 10, 0, tzinfo=TZ)
+
+
+def test_parse_utc_offset():
+    assert parse_utc_offset('UTC+3') == TZ
+    assert parse_utc_offset('UTC-5:30') == timezone(-timedelta(hours=5, minutes=30))
+    assert parse_utc_offset('нет') == timezone.utc
+
+
+def test_next_fire(new_lesson):
+    scheduler = ReminderScheduler(None, lead_minutes=15, tz=TZ)
+    later_today = new_lesson('Алгебра', '10:30')
+    already_started = new_lesson('Физика', '10:10')
+    sunday = new_lesson('Химия', '8:00', 'Воскресенье')
+    assert scheduler._next_fire(later_today, MONDAY_10) == MONDAY_10.replace(minute=15)
+    # Напоминание на сегодня уже прошло - следующее через неделю
+    assert scheduler._next_fire(already_started, MONDAY_10) == datetime(2026, 10, 26, 9, 55, tzinfo=TZ)
+    assert scheduler._next_fire(sunday, MONDAY_10) == datetime(2026, 10, 25, 7, 45, tzinfo=TZ)
+    assert scheduler._next_fire(new_lesson('Без дня', '8:00', 'когда-нибудь'), MONDAY_10) is None
+
+
+def _sqlite_scheduler(tmp_path, make_lesson, count):
+    db = SQLiteScheduleDatabase(str(tmp_path / 'schedule.db'))
+    for hour in range(8, 8 + count):
+        db.add_lesson(make_lesson(f'Урок {hour}', f'{hour}:00'))
+    return db, ReminderScheduler(AsyncScheduleDatabase(db), tz=TZ)
+
+
+def test_refresh_reschedules_only_changed_lessons(tmp_path, make_lesson):
+    db, scheduler = _sqlite_scheduler(tmp_path, make_lesson, 3)
+
+    async def run():
+        await scheduler.reload()
+        for _ in range(100):
+            # SQLite отдаёт новые объекты уроков на каждый запрос
+            db.update_lesson(1, make_lesson('Урок 8', '8:30'))
+            change = ScheduleChange(db.get_version(), frozenset({'Понедельник'}), frozenset({'all'}))
+            await scheduler._refresh(change)
+
+    asyncio.run(run())
+    assert scheduler._generations == {1: 101, 2: 1, 3: 1}
+    assert scheduler.pending() == 3
+    # Устаревшие записи кучи не копятся
+    assert len(scheduler._heap) <= 64
+    db.close()
+
+
+def test_fire_sends_to_matching_subgroups(tmp_path, make_lesson):
+    db = SQLiteScheduleDatabase(str(tmp_path / 'schedule.db'))
+    db.add_lesson(make_lesson('Алгебра', '8:00', subgroup='1'))
+    scheduler = ReminderScheduler(AsyncScheduleDatabase(db), tz=TZ)
+    sent = []
+
+    async def send(user_ids, text):
+        sent.append((sorted(user_ids), text))
+
+    async def run():
+        await scheduler.reload()
+        # reload берёт подписчиков из базы, поэтому задаём их после
+        for user_id, subgroup in ((10, '1'), (20, '2'), (30, 'all')):
+            scheduler.set_user(user_id, subgroup, True)
+        scheduler.send = send
+        due = scheduler._pop_due(scheduler._heap[0][0])
+        await scheduler._fire(due)
+
+    asyncio.run(run())
+    assert len(sent) == 1 and sent[0][0] == ['10', '30']
+    assert 'Алгебра' in sent[0][1]
+    # Следующее напоминание - через неделю
+    assert scheduler.pending() == 1 and len(scheduler._heap) == 1
+    db.close()
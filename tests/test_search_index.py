@@ -0,0 +1,47 @@
+from search_index import SubjectIndex
+
+
+def _index(*lessons):
+    index = SubjectIndex()
+    for lesson in lessons:
+        index.add(lesson)
+    return index
+
+
+def _subjects(lessons):
+    return [lesson.subject for lesson in lessons]
+
+
+def test_prefix_search(new_lesson):
+    index = _index(new_lesson('Математический анализ'), new_lesson('Матлогика'), new_lesson('Физика'))
+    assert _subjects(index.search('мат')) == ['Математический анализ', 'Матлогика']
+    assert _subjects(index.search('мат анал')) == ['Математический анализ']
+    assert index.search('химия') == []
+
+
+def test_typo_search(new_lesson):
+    index = _index(new_lesson('Физика'), new_lesson('Философия'))
+    assert _subjects(index.search('фезика')) == ['Физика']
+    assert index.search('фезика', fuzzy=False) == []
+    # Короткие слова ищутся только точно
+    assert index.search('фзк') == []
+
+
+def test_whole_word_ranks_before_prefix(new_lesson):
+    index = _index(new_lesson('Физкультура'), new_lesson('Физ'), new_lesson('Физика'))
+    assert _subjects(index.search('физ')) == ['Физ', 'Физкультура', 'Физика']
+
+
+def test_typos_only_when_nothing_matches(new_lesson):
+    index = _index(new_lesson('Хемия'), new_lesson('Химия'))
+    assert _subjects(index.search('химия')) == ['Химия']
+    assert _subjects(index.search('хамия')) == ['Хемия', 'Химия']
+
+
+def test_yo_and_remove(new_lesson):
+    lesson = new_lesson('Ёмкостные цепи')
+    index = _index(lesson)
+    assert index.search('емкостные') == [lesson]
+    index.remove(lesson.id)
+    assert index.search('емкостные') == []
+    assert len(index) == 0
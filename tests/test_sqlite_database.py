@@ -0,0 +1,86 @@
+from database import ScheduleDatabase
+from sqlite_database import SQLiteScheduleDatabase
+
+
+def test_migrate_from_json_replays_journal(tmp_path, make_lesson):
+    json_file = str(tmp_path / 'schedule.json')
+    source = ScheduleDatabase(json_file, journal=True)
+    source.add_lesson(make_lesson('Алгебра'))
+    source.set_user_subgroup(42, '2', username='student')
+    source.flush_users()
+
+    db = SQLiteScheduleDatabase(str(tmp_path / 'schedule.db'))
+    assert db.migrate_from_json(json_file) == 1
+    assert [l['subject'] for l in db.get_all_lessons()] == ['Алгебра']
+    assert db.get_user_subgroup(42) == '2'
+    db.close()
+
+
+def test_migrate_from_json_runs_once(tmp_path, make_lesson):
+    json_file = str(tmp_path / 'schedule.json')
+    ScheduleDatabase(json_file).add_lesson(make_lesson('Алгебра'))
+    db_file = str(tmp_path / 'schedule.db')
+
+    db = SQLiteScheduleDatabase(db_file)
+    assert db.migrate_from_json(json_file) == 1
+    for lesson in db.get_all_lessons():
+        db.delete_lesson(lesson['id'])
+    db.close()
+
+    # Все уроки удалили - после перезапуска они не должны вернуться
+    db = SQLiteScheduleDatabase(db_file)
+    assert db.migrate_from_json(json_file) == 0
+    assert db.get_all_lessons() == []
+    db.close()
+
+
+def test_week_groups_day_aliases_like_json(tmp_path, make_lesson):
+    json_db = ScheduleDatabase(str(tmp_path / 'schedule.json'))
+    db = SQLiteScheduleDatabase(str(tmp_path / 'schedule.db'))
+    for target in (json_db, db):
+        target.add_lesson(make_lesson('Алгебра'))
+    # Старая запись с сокращённым днём, сохранённая до канонизации
+    with db._connection() as conn, conn:
+        conn.execute("UPDATE lessons SET day = 'пн' WHERE id = 1")
+    db.add_lesson(make_lesson('Физика', '10:00'))
+    json_db.add_lesson(make_lesson('Физика', '10:00'))
+
+    week = db.get_week_for_subgroup('all')
+    assert list(week) == ['Понедельник']
+    assert [l['subject'] for l in week['Понедельник']] == ['Алгебра', 'Физика']
+    assert list(json_db.get_week_for_subgroup('all')) == list(week)
+    db.close()
+
+
+def test_close_keeps_checked_out_connections_counted(tmp_path):
+    db = SQLiteScheduleDatabase(str(tmp_path / 'schedule.db'), pool_size=2)
+    with db._connection():
+        db.close()
+        assert db._connections_created == 1
+    with db._connection(), db._connection():
+        assert db._connections_created == 2
+    db.close()
+
+
+def test_deleted_last_id_is_not_reused(tmp_path, make_lesson):
+    json_file = str(tmp_path / 'schedule.json')
+    json_db = ScheduleDatabase(json_file)
+    db = SQLiteScheduleDatabase(str(tmp_path / 'schedule.db'))
+    for target in (json_db, db):
+        target.add_lesson(make_lesson('Алгебра'))
+        last_id = target.add_lesson(make_lesson('Физика', '10:00'))['lesson_id']
+        target.delete_lesson(last_id)
+    db.close()
+
+    # После перезапуска обе базы выдают следующий id, а не id удалённого урока
+    json_db = ScheduleDatabase(json_file)
+    db = SQLiteScheduleDatabase(str(tmp_path / 'schedule.db'))
+    assert json_db.add_lesson(make_lesson('Химия'))['lesson_id'] == 3
+    assert db.add_lesson(make_lesson('Химия'))['lesson_id'] == 3
+    db.close()
+
+    migrated = SQLiteScheduleDatabase(str(tmp_path / 'migrated.db'))
+    json_db.delete_lesson(3)
+    assert migrated.migrate_from_json(json_file) == 1
+    assert migrated.add_lesson(make_lesson('Химия'))['lesson_id'] == 4
+    migrated.close()
@@ -0,0 +1,49 @@
+from stats import WINDOW_MINUTES, ScheduleStats
+
+
+def _stats(*lessons, views=('1', '2', 'all')):
+    stats = ScheduleStats(views)
+    for lesson in lessons:
+        stats.add(lesson)
+    return stats
+
+
+def test_window_boundary(new_lesson):
+    first = new_lesson('Алгебра', '8:00', end='9:00')
+    stats = _stats(
+        first,
+        new_lesson('Физика', f'{9 + WINDOW_MINUTES // 60}:00'),
+        new_lesson('Химия', '8:00', 'Вторник', end='9:00'),
+        new_lesson('Биология', '9:59', 'Вторник'),
+    )
+    result = stats.get('all')
+    # Перерыв ровно в WINDOW_MINUTES - окно, на минуту короче - нет
+    assert (result['windows'], result['window_minutes']) == (1, WINDOW_MINUTES)
+
+
+def test_window_closes_when_middle_lesson_added_and_reopens_on_remove(new_lesson):
+    middle = new_lesson('Физика', '9:30', end='10:30')
+    stats = _stats(new_lesson('Алгебра', '8:00', end='9:30'), new_lesson('Химия', '12:00'))
+    assert stats.get('all')['windows'] == 1
+
+    stats.add(middle)
+    result = stats.get('all')
+    assert (result['windows'], result['window_minutes']) == (1, 90)
+
+    stats.remove(middle)
+    result = stats.get('all')
+    assert (result['windows'], result['window_minutes']) == (1, 150)
+
+
+def test_subgroup_views_and_durations(new_lesson):
+    stats = _stats(
+        new_lesson('Алгебра', '8:00', end='9:00', subgroup='1'),
+        new_lesson('Физика', '8:00', subgroup='2'),
+        new_lesson('Химия', '10:00', 'Среда', subgroup='all'),
+    )
+    assert stats.get('1')['total_lessons'] == 2
+    assert stats.get('2')['total_lessons'] == 2
+    assert stats.get('all')['total_lessons'] == 3
+    # Явный конец - 60 минут, без конца - стандартная пара 90
+    assert stats.get('all')['contact_hours'] == round((60 + 90 + 90) / 60, 1)
+    assert stats.get('all')['earliest_start'] == '8:00'
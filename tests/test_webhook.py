@@ -0,0 +1,126 @@
+import importlib
+import json
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from telegram.ext import Application, CommandHandler
+
+SECRET = 's3cr3t'
+BOT_USER = {'id': 42, 'is_bot': True, 'first_name': 'Bot', 'username': 'schedule_bot'}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class FakeBotApi(BaseHTTPRequestHandler):
+    """Поддельный Bot API: на любой метод отвечает успехом и запоминает вызов"""
+    calls = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        method = self.path.rsplit('/', 1)[1]
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.calls.append(method)
+        result = {
+            'getMe': BOT_USER,
+            'sendMessage': {'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'}, 'text': ''},
+        }.get(method, True)
+        body = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    monkeypatch.setenv('BOT_TOKEN', '1:test')
+    monkeypatch.setenv('DB_FILE', str(tmp_path / 'schedule.json'))
+    sys.modules.pop('bot', None)
+    module = importlib.import_module('bot')
+    yield module
+    sys.modules.pop('bot', None)
+
+
+def _post_update(port: int, secret: str) -> int:
+    update = {
+        'update_id': 1,
+        'message': {
+            'message_id': 5, 'date': int(time.time()), 'text': '/start',
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'T'},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+        },
+    }
+    request = urllib.request.Request(
+        f'http://127.0.0.1:{port}/telegram', data=json.dumps(update).encode(),
+        headers={'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': secret}
+    )
+    try:
+        return urllib.request.urlopen(request, timeout=5).status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_webhook_checks_secret(bot, monkeypatch):
+    FakeBotApi.calls = []
+    api = ThreadingHTTPServer(('127.0.0.1', 0), FakeBotApi)
+    threading.Thread(target=api.serve_forever, daemon=True).start()
+
+    port = _free_port()
+    monkeypatch.setattr(bot, 'BOT_MODE', 'webhook')
+    monkeypatch.setattr(bot, 'WEBHOOK_URL', 'https://example.org/')
+    monkeypatch.setattr(bot, 'WEBHOOK_LISTEN', '127.0.0.1')
+    monkeypatch.setattr(bot, 'WEBHOOK_PORT', port)
+    monkeypatch.setattr(bot, 'WEBHOOK_SECRET', SECRET)
+
+    handled = []
+
+    async def start(update, context):
+        await bot.start_command(update, context)
+        handled.append(update.update_id)
+        context.application.stop_running()
+
+    application = (
+        Application.builder()
+        .token('1:test')
+        .base_url(f'http://127.0.0.1:{api.server_port}/bot')
+        .build()
+    )
+    application.add_handler(CommandHandler('start', start))
+
+    statuses = {}
+
+    def client():
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        statuses['wrong'] = _post_update(port, 'wrong')
+        statuses['right'] = _post_update(port, SECRET)
+
+    threading.Thread(target=client, daemon=True).start()
+    try:
+        bot.run_application(application)
+    finally:
+        api.shutdown()
+
+    assert statuses == {'wrong': 403, 'right': 200}
+    assert handled == [1]
+    assert 'setWebhook' in FakeBotApi.calls
+    assert 'sendMessage' in FakeBotApi.calls
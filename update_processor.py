@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+MAX_CONCURRENT_UPDATES = 8
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с сохранением порядка внутри чата.
+
+    Обновления разных чатов обрабатываются одновременно, но не более
+    workers сразу; обновления одного чата - строго по очереди, чтобы,
+    например, /confirm_delete_N не обогнал /delete. Место среди workers
+    обновление занимает только после того, как дошла очередь его
+    чата: длинная очередь одного чата не задерживает остальные.
+    """
+
+    def __init__(self, workers: int = MAX_CONCURRENT_UPDATES):
+        super().__init__(workers)
+        self._workers = asyncio.Semaphore(workers)
+        self._chat_locks: Dict[Hashable, asyncio.Lock] = {}
+        self._chat_waiters: Dict[Hashable, int] = {}
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[Hashable]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return ('user', update.effective_user.id)
+        return None
+
+    async def process_update(self, update: object,  # type: ignore[misc]
+                             coroutine: Awaitable[Any]) -> None:
+        # Семафор базового класса не берём: он держался бы и во время
+        # ожидания очереди чата, и один чат мог бы занять все места
+        await self.do_process_update(update, coroutine)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._chat_key(update)
+        if key is None:
+            async with self._workers:
+                await coroutine
+            return
+
+        lock = self._chat_locks.setdefault(key, asyncio.Lock())
+        self._chat_waiters[key] = self._chat_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                async with self._workers:
+                    await coroutine
+        finally:
+            # Замки молчащих чатов не копим
+            self._chat_waiters[key] -= 1
+            if not self._chat_waiters[key]:
+                del self._chat_waiters[key]
+                del self._chat_locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._chat_locks.clear()
+        self._chat_waiters.clear()